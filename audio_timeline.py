@@ -0,0 +1,308 @@
+import io
+import wave
+
+import numpy as np
+
+
+class PcmAudio:
+    """16-bit PCM audio kept as an interleaved NumPy int16 array.
+
+    Mirrors the parts of AudioSegment the converter uses (``len`` in
+    milliseconds, millisecond slicing, ``duration_seconds``) without going
+    through ffmpeg or copying samples into bytes.
+    """
+
+    sample_width = 2
+
+    def __init__(self, samples, frame_rate, channels=1):
+        self.samples = samples
+        self.frame_rate = frame_rate
+        self.channels = channels
+
+    @classmethod
+    def from_wav(cls, data):
+        """Decodes LINEAR16 audio (a WAV file) from bytes."""
+        with wave.open(io.BytesIO(data), 'rb') as wf:
+            if wf.getsampwidth() != 2:
+                raise ValueError(f"Expected 16-bit PCM, got {wf.getsampwidth() * 8}-bit")
+            frames = wf.readframes(wf.getnframes())
+            return cls(np.frombuffer(frames, dtype=np.int16), wf.getframerate(), wf.getnchannels())
+
+    @classmethod
+    def from_segment(cls, segment):
+        segment = segment.set_sample_width(2)
+        return cls(np.frombuffer(segment.raw_data, dtype=np.int16), segment.frame_rate, segment.channels)
+
+    @property
+    def frames(self):
+        return len(self.samples) // self.channels
+
+    @property
+    def duration_seconds(self):
+        return self.frames / self.frame_rate
+
+    def __len__(self):
+        return int(round(self.duration_seconds * 1000))
+
+    def __getitem__(self, millisecond):
+        if not isinstance(millisecond, slice):
+            millisecond = slice(millisecond, millisecond + 1)
+        start, stop, _ = millisecond.indices(len(self))
+        start_frame = int(start * self.frame_rate / 1000)
+        stop_frame = int(stop * self.frame_rate / 1000)
+        return PcmAudio(self.samples[start_frame * self.channels:stop_frame * self.channels], self.frame_rate, self.channels)
+
+    def to_wav(self):
+        """Encodes the clip as LINEAR16 audio (a WAV file)."""
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wf:
+            wf.setnchannels(self.channels)
+            wf.setsampwidth(self.sample_width)
+            wf.setframerate(self.frame_rate)
+            wf.writeframes(self.samples.tobytes())
+        return buffer.getvalue()
+
+    def to_segment(self):
+        from pydub import AudioSegment
+
+        return AudioSegment(
+            data=self.samples.tobytes(),
+            sample_width=self.sample_width,
+            frame_rate=self.frame_rate,
+            channels=self.channels
+        )
+
+
+def conform_samples(clip, frame_rate, channels):
+    """Returns the samples of ``clip`` (PcmAudio or AudioSegment) at ``frame_rate`` and ``channels``."""
+    if not isinstance(clip, PcmAudio):
+        clip = PcmAudio.from_segment(clip)
+    samples = clip.samples
+    if clip.channels != channels:
+        frames = samples.reshape(-1, clip.channels).mean(axis=1)
+        samples = np.repeat(frames, channels).astype(np.int16)
+    if clip.frame_rate != frame_rate:
+        frames = samples.reshape(-1, channels)
+        count = int(round(len(frames) * frame_rate / clip.frame_rate))
+        positions = np.linspace(0, len(frames) - 1, count)
+        samples = np.column_stack([
+            np.interp(positions, np.arange(len(frames)), frames[:, c]) for c in range(channels)
+        ]).astype(np.int16).ravel()
+    return samples
+
+
+def _silent_window_starts(audio, min_silence_len, silence_thresh):
+    """Start (in ms) of every silent ``min_silence_len`` window, the way pydub judges silence."""
+    length = len(audio)
+    # pydub calls a window silent when int(rms) <= threshold, with rms over all samples
+    threshold = 10 ** (silence_thresh / 20) * 2 ** (8 * audio.sample_width - 1)
+    limit = (np.floor(threshold) + 1) ** 2
+
+    frame_energy = np.square(audio.samples.astype(np.int64)).reshape(-1, audio.channels).sum(axis=1)
+    cumulative = np.concatenate(([0], np.cumsum(frame_energy)))
+
+    window_starts = np.arange(length - min_silence_len + 1)
+    start_frames = (window_starts * (audio.frame_rate / 1000.0)).astype(np.int64)
+    end_frames = ((window_starts + min_silence_len) * (audio.frame_rate / 1000.0)).astype(np.int64)
+    total_frames = len(frame_energy)
+    energy = cumulative[np.minimum(end_frames, total_frames)] - cumulative[np.minimum(start_frames, total_frames)]
+    # Frames past the end are counted as silence, as pydub pads short slices
+    sample_counts = (end_frames - start_frames) * audio.channels
+    return np.flatnonzero(energy < limit * sample_counts)
+
+
+def detect_nonsilent_bounds(audio, min_silence_len=100, silence_thresh=-40):
+    """Returns ``(start_ms, end_ms)`` of the audio between leading and trailing silence.
+
+    Gives the same result as the first start and last end of pydub's
+    ``detect_nonsilent`` with ``seek_step=1``, including its merging of silent
+    ranges separated by less than ``min_silence_len``, but computes the RMS of
+    every window at once from a cumulative sum of squares instead of slicing
+    the clip once per millisecond. Returns None when the clip is entirely
+    silent, and the whole clip when it is shorter than ``min_silence_len``.
+    """
+    length = len(audio)
+    if length < min_silence_len:
+        return 0, length
+
+    silent_starts = _silent_window_starts(audio, min_silence_len, silence_thresh)
+    if len(silent_starts) == 0:
+        return 0, length
+
+    gaps = np.flatnonzero(np.diff(silent_starts) > min_silence_len)
+    first_range_end = (silent_starts[gaps[0]] if len(gaps) else silent_starts[-1]) + min_silence_len
+    last_range_start = silent_starts[gaps[-1] + 1] if len(gaps) else silent_starts[0]
+    last_range_end = silent_starts[-1] + min_silence_len
+
+    if silent_starts[0] == 0 and first_range_end == length:
+        return None
+
+    start = int(first_range_end) if silent_starts[0] == 0 else 0
+    end = int(last_range_start) if last_range_end == length else length
+    return start, end
+
+
+def split_at_offsets(audio, offsets):
+    """Cuts ``audio`` at ``offsets`` (seconds, ascending); the first clip starts at the first offset."""
+    bounds = [int(round(offset * 1000)) for offset in offsets] + [len(audio)]
+    return [audio[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def split_at_pauses(audio, count, min_silence_len=150, silence_thresh=-40):
+    """Cuts ``audio`` into ``count`` clips in the middle of its ``count - 1`` longest inner pauses.
+
+    Pauses are silent stretches of at least ``min_silence_len`` ms that
+    neither start nor end the clip. Returns None when there are fewer pauses
+    than needed.
+    """
+    if count <= 1:
+        return [audio]
+    length = len(audio)
+    if length < min_silence_len:
+        return None
+    silent_starts = _silent_window_starts(audio, min_silence_len, silence_thresh)
+    if len(silent_starts) == 0:
+        return None
+
+    breaks = np.flatnonzero(np.diff(silent_starts) > 1)
+    range_starts = silent_starts[np.concatenate(([0], breaks + 1))]
+    range_ends = silent_starts[np.concatenate((breaks, [len(silent_starts) - 1]))] + min_silence_len
+    inner = (range_starts > 0) & (range_ends < length)
+    range_starts, range_ends = range_starts[inner], range_ends[inner]
+    if len(range_starts) < count - 1:
+        return None
+
+    longest = np.sort(np.argsort(range_starts - range_ends, kind="stable")[:count - 1])
+    cuts = (range_starts[longest] + range_ends[longest]) // 2
+    return split_at_offsets(audio, [0.0] + [cut / 1000 for cut in cuts])
+
+
+class TimelineBuilder:
+    """Assembles the output track from per-subtitle audio clips.
+
+    Growing a single AudioSegment with ``+=`` copies everything built so far on
+    every append, which makes long conversions quadratic. The builder instead
+    keeps the samples in fixed-size chunks, writes each clip at its offset and
+    only builds the output when the track is exported. Silence is never
+    materialized: chunks start out zeroed and the cursor just moves forward.
+    Clips can be PcmAudio or AudioSegment.
+    """
+
+    sample_width = 2  # Samples are kept as int16
+
+    def __init__(self, frame_rate=None, channels=1, chunk_seconds=60):
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.chunk_seconds = chunk_seconds
+        self._chunks = []
+        self._chunk_frames = None
+        self._pending_silence = 0.0
+        self.frames = 0
+
+    def __len__(self):
+        # Milliseconds, like len(AudioSegment)
+        return int(self.duration_seconds * 1000)
+
+    @property
+    def duration_seconds(self):
+        if not self.frame_rate:
+            return self._pending_silence
+        return self.frames / self.frame_rate
+
+    def _configure(self, clip):
+        if self.frame_rate is None:
+            self.frame_rate = clip.frame_rate
+        self._chunk_frames = int(self.frame_rate * self.chunk_seconds)
+        self.frames = self._seconds_to_frames(self._pending_silence)
+
+    def _seconds_to_frames(self, seconds):
+        return int(round(seconds * self.frame_rate))
+
+    def _conform(self, clip):
+        return conform_samples(clip, self.frame_rate, self.channels)
+
+    def _ensure_chunks(self, end_frame):
+        while len(self._chunks) * self._chunk_frames < end_frame:
+            self._chunks.append(np.zeros(self._chunk_frames * self.channels, dtype=np.int16))
+
+    def write_samples(self, samples, offset_frames):
+        """Writes interleaved int16 samples starting at ``offset_frames``."""
+        frame_count = len(samples) // self.channels
+        end_frame = offset_frames + frame_count
+        self._ensure_chunks(end_frame)
+
+        position = offset_frames
+        consumed = 0
+        while position < end_frame:
+            chunk_index, chunk_offset = divmod(position, self._chunk_frames)
+            take = min(self._chunk_frames - chunk_offset, end_frame - position)
+            chunk = self._chunks[chunk_index]
+            chunk[chunk_offset * self.channels:(chunk_offset + take) * self.channels] = \
+                samples[consumed * self.channels:(consumed + take) * self.channels]
+            position += take
+            consumed += take
+
+        self.frames = max(self.frames, end_frame)
+
+    def place(self, clip, offset_seconds):
+        """Writes ``clip`` at ``offset_seconds`` from the start of the track."""
+        if self._chunk_frames is None:
+            self._configure(clip)
+        self.write_samples(self._conform(clip), self._seconds_to_frames(offset_seconds))
+
+    def append(self, clip, lead_silence=0.0):
+        """Places ``clip`` after ``lead_silence`` seconds at the end of the track."""
+        self.place(clip, self.duration_seconds + lead_silence)
+
+    def append_silence(self, seconds):
+        if self._chunk_frames is None:
+            # The sample format is only known once the first clip arrives
+            self._pending_silence += seconds
+            return
+        self.frames += self._seconds_to_frames(seconds)
+
+    def pad_to(self, seconds):
+        """Extends the track with silence so it lasts at least ``seconds``."""
+        if seconds > self.duration_seconds:
+            self.append_silence(seconds - self.duration_seconds)
+
+    def _pcm_chunks(self):
+        """Yields the track as bytes, releasing chunks as they are consumed."""
+        remaining = self.frames
+        while self._chunks and remaining > 0:
+            chunk = self._chunks.pop(0)
+            take = min(self._chunk_frames, remaining)
+            yield chunk[:take * self.channels].tobytes()
+            remaining -= take
+        self._chunks = []
+        if remaining > 0:
+            # Trailing silence that was never written to a chunk
+            yield bytes(remaining * self.channels * self.sample_width)
+
+    def to_segment(self):
+        """Materializes the track as a single AudioSegment."""
+        from pydub import AudioSegment
+
+        if self._chunk_frames is None:
+            return AudioSegment.silent(duration=len(self))
+
+        # Chunks are released as they are converted so that materializing
+        # holds roughly one copy of the track until the final join.
+        return AudioSegment(
+            data=b"".join(self._pcm_chunks()),
+            sample_width=self.sample_width,
+            frame_rate=self.frame_rate,
+            channels=self.channels
+        )
+
+    def export(self, out_f, format="mp3"):
+        """Writes the track; WAV is written directly, other formats go through ffmpeg once."""
+        if format == "wav" and self._chunk_frames is not None:
+            with wave.open(out_f, 'wb') as wf:
+                wf.setnchannels(self.channels)
+                wf.setsampwidth(self.sample_width)
+                wf.setframerate(self.frame_rate)
+                for data in self._pcm_chunks():
+                    wf.writeframes(data)
+            return out_f
+        return self.to_segment().export(out_f, format=format)
@@ -0,0 +1,137 @@
+"""Checks and measures coalescing of short subtitles into marked SSML requests.
+
+Runs against the offline synthetic engine, which speaks SSML and reports the
+time of each ``<mark>``; a second engine reports no timepoints, so clips are
+cut at pauses instead. The script first checks that every clip cut from a
+coalesced request trims to the same length as the line synthesized on its
+own. It then converts a dialogue-heavy file (short lines with room to spare)
+without and with coalescing, comparing request counts, time and the length
+of the output. Exits with status 1 if a check fails.
+
+    python benchmarks/bench_coalesce.py --cues 400 --latency 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from srt_corpus import write_srt
+
+from audio_timeline import PcmAudio
+from srt_to_audio_core import SubtitleToSpeechConverter, trim_silence
+from tts_backends import SyntheticTTSBackend
+from voice_calibration import VoiceModelStore
+
+LINES = ["Yes.", "No!", "Come on.", "Thank you.", "Look out!", "What?", "Wait for me.", "Where are you going?",
+         "I know.", "Not now.", "Hurry up!", "Really?", "Over here.", "Stop it.", "Okay, okay.", "Let's go."]
+
+
+def make_dialogue(count, seed=0):
+    """Short lines, one after another, each with more time than it needs."""
+    rng = random.Random(seed)
+    cues = []
+    start = 1.0
+    for _ in range(count):
+        text = rng.choice(LINES)
+        duration = rng.uniform(0.9, 1.8)
+        cues.append((start, start + duration, text))
+        start += duration + rng.choice([0.1, 0.2, 0.4, 1.0])
+    return cues
+
+
+def make_converter(directory, name, latency, report_timepoints=True):
+    backend = SyntheticTTSBackend(latency=latency, report_timepoints=report_timepoints)
+    converter = SubtitleToSpeechConverter(
+        backend=backend, use_cache=False, log=lambda message: None,
+        voice_models=VoiceModelStore(os.path.join(directory, f"voice_models_{name}.json"))
+    )
+    return converter, backend
+
+
+def check_split(directory, seed, groups=50):
+    """Largest difference in ms between a trimmed coalesced clip and the same line synthesized alone.
+
+    Also returns how many clips came from single requests instead of the coalesced one.
+    """
+    rng = random.Random(seed)
+    worst = 0
+    single = 0
+    for report_timepoints in (True, False):
+        converter, _ = make_converter(directory, "split", 0.0, report_timepoints)
+        voice = converter.find_voice("Synthetic-A")
+        for _ in range(groups):
+            texts = [rng.choice(LINES) for _ in range(rng.randint(2, 8))]
+            rate = rng.choice([0.85, 1.0, 1.15])
+            clips = converter.synthesize_coalesced(texts, voice, "en-US", rate, 0)
+            for text, (clip, coalesced) in zip(texts, clips):
+                single += not coalesced
+                alone = converter.synthesize(text, voice, "en-US", rate, 0, "LINEAR16")
+                expected = len(trim_silence(PcmAudio.from_wav(alone.audio_content)))
+                worst = max(worst, abs(len(trim_silence(clip)) - expected))
+    return worst, single
+
+
+def convert(directory, srt_file, name, latency, concurrency, coalesce, seed, report_timepoints=True):
+    converter, backend = make_converter(directory, name, latency, report_timepoints)
+    voice = converter.find_voice("Synthetic-A")
+    # Calibration samples lines at random; the same sample makes the runs comparable
+    random.seed(seed)
+    converter.determine_voice_characteristics([srt_file], voice, "en-US")
+    calls = backend.calls
+    output_file = os.path.join(directory, f"{name}.wav")
+    start = time.perf_counter()
+    converter.convert([srt_file], output_file, voice.name, concurrency=concurrency, resume=False,
+                      coalesce=coalesce)
+    elapsed = time.perf_counter() - start
+    with open(output_file, "rb") as f:
+        seconds = PcmAudio.from_wav(f.read()).duration_seconds
+    return backend.calls - calls, elapsed, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cues", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per synthetic request")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        worst, single = check_split(directory, args.seed)
+        print(f"split check   largest clip difference {worst} ms, {single} clips from single requests")
+        if worst > 5:
+            failures.append(f"coalesced clips differ from single requests by up to {worst} ms")
+        if single:
+            failures.append(f"{single} clips were synthesized on their own instead of cut from the coalesced request")
+
+        srt_file = os.path.join(directory, "dialogue.srt")
+        write_srt(srt_file, make_dialogue(args.cues, args.seed))
+        runs = [("single", False, True), ("marks", True, True), ("pauses", True, False)]
+        results = {}
+        for name, coalesce, report_timepoints in runs:
+            requests, elapsed, seconds = convert(directory, srt_file, name, args.latency, args.concurrency,
+                                                 coalesce, args.seed, report_timepoints)
+            results[name] = (requests, elapsed, seconds)
+            print(f"{name:<12}{requests:>6} requests  {elapsed:7.2f}s  {args.cues / elapsed:7.1f} cues/s  "
+                  f"output {seconds:8.2f}s")
+
+    single_requests, single_time, single_seconds = results["single"]
+    for name in ("marks", "pauses"):
+        requests, elapsed, seconds = results[name]
+        print(f"{name:<12}{single_requests / requests:6.1f}x fewer requests  {single_time / elapsed:5.1f}x faster")
+        if requests >= single_requests:
+            failures.append(f"{name}: coalescing did not reduce requests")
+        if abs(seconds - single_seconds) > 0.05:
+            failures.append(f"{name}: output is {seconds:.2f}s instead of {single_seconds:.2f}s")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Measures the speculative synthesis pipeline against the serial path.
+
+Uses a fake synthesizer that sleeps for a fixed latency and returns silence
+whose length follows a linear CPM model, so no network access is needed.
+
+    python benchmarks/bench_pipeline.py --cues 300 --latency 0.05 --concurrency 8
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_timeline import TimelineBuilder
+from synthesis_pipeline import CuePlanner, SynthesisPipeline, place_cue
+
+WORDS = "the quick brown fox jumps over a lazy dog while we wait for our train to arrive".split()
+
+
+class FakeSynthesizer:
+    """Stands in for a TTS call: sleeps ``latency`` seconds and returns silence."""
+
+    def __init__(self, cpm_model, latency, jitter=0.0, frame_rate=24000):
+        self.cpm_model = cpm_model
+        self.latency = latency
+        self.jitter = jitter
+        self.frame_rate = frame_rate
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text, rate):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            seconds = len(text) / (self.cpm_model(rate) / 60)
+            # Real voices miss the CPM model a little; keep it deterministic per request
+            noise = random.Random(zlib.crc32(f"{text}|{rate:.4f}".encode())).uniform(-1, 1)
+            seconds *= 1 + self.jitter * noise
+            return AudioSegment.silent(duration=seconds * 1000, frame_rate=self.frame_rate)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def make_cues(count, seed=0):
+    rng = random.Random(seed)
+    cues = []
+    start = 1.0
+    for _ in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 14)))
+        text += rng.choice([".", ",", "?", ""])
+        duration = rng.uniform(1.0, 4.5)
+        cues.append((start, start + duration, text))
+        start += duration + rng.uniform(0.0, 1.5)
+    return cues
+
+
+def run(cues, cpm_model, latency, jitter, concurrency):
+    synthesizer = FakeSynthesizer(cpm_model, latency, jitter)
+    planner = CuePlanner(cpm_model, 0.85, 1.15)
+    pipeline = SynthesisPipeline(synthesizer, planner, concurrency=concurrency)
+    timeline = TimelineBuilder()
+    rates = []
+    start = time.perf_counter()
+    for result in pipeline.run(cues, timeline):
+        place_cue(timeline, result.audio, result.cue[2], result.plan.final_subtitle_duration)
+        rates.append(result.rate)
+    elapsed = time.perf_counter() - start
+    return elapsed, timeline.duration_seconds, rates, pipeline, synthesizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cues", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--jitter", type=float, default=0.1,
+                        help="relative error of the fake voice against the CPM model")
+    args = parser.parse_args()
+
+    cues = make_cues(args.cues)
+    cpm_model = np.poly1d([900.0, 0.0])
+
+    serial_time, serial_length, serial_rates, _, _ = run(cues, cpm_model, args.latency, args.jitter, 1)
+    print(f"serial      {serial_time:7.2f}s  {len(cues) / serial_time:7.1f} cues/s  timeline {serial_length:8.1f}s")
+
+    piped_time, piped_length, piped_rates, pipeline, synthesizer = run(cues, cpm_model, args.latency, args.jitter, args.concurrency)
+    drift = max(abs(a - b) for a, b in zip(serial_rates, piped_rates))
+    print(f"pipelined   {piped_time:7.2f}s  {len(cues) / piped_time:7.1f} cues/s  timeline {piped_length:8.1f}s")
+    print(f"speedup     {serial_time / piped_time:7.2f}x  max in flight {synthesizer.max_in_flight}  "
+          f"requests {pipeline.requests}  reused {pipeline.reused}  re-synthesized {pipeline.resynthesized}  "
+          f"max rate difference {drift:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Times whole-file rate planning and compares it with per-cue root finding.
+
+Plans a generated subtitle file the old way (a scipy brentq solve per cue)
+and with ``CuePlanner.plan_all``, checks that both give the same rates, and
+counts the cues pinned at the maximum rate with and without lag spreading.
+
+    python benchmarks/bench_planner.py --cues 10000 --spread-lag 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.optimize import root_scalar
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthesis_pipeline import CuePlanner, EDGE_SILENCE, trailing_silence
+
+
+def make_cues(count, seed=0):
+    """Subtitles of varying length and pace, some too dense to speak in time."""
+    rng = np.random.default_rng(seed)
+    words = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "again", "tomorrow"]
+    cues = []
+    start = 0.0
+    for _ in range(count):
+        text = " ".join(rng.choice(words, rng.integers(2, 14))) + rng.choice([".", ",", "?", ""])
+        duration = rng.uniform(1.0, 5.0)
+        cues.append((start, start + duration, text))
+        start += duration + rng.uniform(0.0, 0.6)
+    return cues
+
+
+def plan_with_root_finding(cues, cpm_model, min_rate, max_rate):
+    """The per-cue planning loop as it was: evaluate the model and solve for every cue."""
+    rates = []
+    timeline = 0.0
+    for start_time, end_time, text in cues:
+        min_cpm, max_cpm = cpm_model(min_rate), cpm_model(max_rate)
+        duration = max(end_time - start_time - (timeline - start_time), 1)
+        cpm = min(max(len(text) / (duration / 60), min_cpm), max_cpm)
+        rates.append(root_scalar(lambda x: cpm_model(x) - cpm, bracket=[0.5, 2.0], method='brentq').root)
+        timeline += max(EDGE_SILENCE + len(text) / (cpm / 60) + trailing_silence(text), duration)
+    return np.array(rates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cues", type=int, default=10000)
+    parser.add_argument("--spread-lag", type=int, default=4)
+    args = parser.parse_args()
+
+    cues = make_cues(args.cues)
+    cpm_model = np.poly1d([-120.0, 1150.0, -60.0])
+
+    start = time.perf_counter()
+    reference = plan_with_root_finding(cues, cpm_model, 0.85, 1.15)
+    root_time = time.perf_counter() - start
+
+    planner = CuePlanner(cpm_model, 0.85, 1.15)
+    start = time.perf_counter()
+    plans = planner.plan_all(cues, 0.0)
+    plan_time = time.perf_counter() - start
+
+    spread = CuePlanner(cpm_model, 0.85, 1.15, spread_lag=args.spread_lag).plan_all(cues, 0.0)
+    difference = np.max(np.abs(plans.rate - reference))
+
+    print(f"{len(cues)} cues")
+    print(f"per-cue root finding: {root_time * 1000:8.1f} ms")
+    print(f"plan_all:             {plan_time * 1000:8.1f} ms ({root_time / plan_time:.0f}x)")
+    print(f"largest rate difference: {difference:.2e}")
+    print(f"cues at max rate: {np.sum(plans.final_cpm >= planner.max_cpm)} "
+          f"(spread over {args.spread_lag}: {np.sum(spread.final_cpm >= planner.max_cpm)})")
+    return 0 if difference < 1e-6 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Checks that conversions ride out engine throttling through the request scheduler.
+
+Converts a generated file with the offline synthetic engine three times: once
+undisturbed, once through a throttle window short enough for retries to
+succeed, and once with a per-line deadline shorter than the window, so that
+some lines fail. Every line has room to spare, so each is spoken at the
+minimum rate and the runs can be compared sample by sample. The script checks
+that
+
+- every cue is accounted for: placed with audio, or reported as failed;
+- the throttled run with a long deadline matches the undisturbed run exactly;
+- failed cues are silent for exactly their slot, and the audio outside
+  those slots matches the undisturbed run;
+- the engine saw ``--concurrency`` requests at once before the window, and
+  at most half as many once the scheduler had backed off inside it.
+
+Exits with status 1 if a check fails.
+
+    python benchmarks/bench_throttling.py --cues 200 --window 0.5,1.5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from srt_corpus import write_srt
+
+from audio_timeline import PcmAudio
+from request_scheduler import RequestScheduler
+from srt_to_audio_core import SubtitleToSpeechConverter
+from tts_backends import SyntheticTTSBackend
+from voice_calibration import VoiceModelStore
+
+LINES = ["Yes.", "No!", "Come on.", "Thank you.", "Look out!", "What?", "Wait for me.", "I know.",
+         "Not now.", "Hurry up!", "Really?", "Over here.", "Stop it.", "Let's go."]
+
+
+def make_roomy_cues(count, seed=0):
+    """Short lines in long slots, so none needs more than the minimum rate."""
+    rng = random.Random(seed)
+    cues = []
+    start = 1.0
+    for _ in range(count):
+        duration = rng.uniform(2.0, 3.0)
+        cues.append((start, start + duration, rng.choice(LINES)))
+        start += duration + rng.choice([0.1, 0.3, 0.6])
+    return cues
+
+
+class CountingBackend(SyntheticTTSBackend):
+    """Records how many requests the engine is serving as each one arrives."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.arrivals = []  # (monotonic time, requests in flight including this one)
+        self._count_lock = threading.Lock()
+
+    def synthesize(self, *args):
+        with self._count_lock:
+            self.in_flight += 1
+            self.arrivals.append((time.monotonic(), self.in_flight))
+        try:
+            return super().synthesize(*args)
+        finally:
+            with self._count_lock:
+                self.in_flight -= 1
+
+    def peak(self, start=0.0, end=float("inf")):
+        """Most requests in flight at an arrival between ``start`` and ``end`` seconds after the first request."""
+        return max((count for arrived, count in self.arrivals if start <= arrived - self._started < end), default=0)
+
+
+def convert(directory, srt_file, name, latency, concurrency, throttle_windows=(), deadline=120.0):
+    """Runs one conversion.
+
+    Returns its ConversionResult, the output audio and the engine, whose
+    ``peak`` tells how many requests it served at once.
+    """
+    scheduler = RequestScheduler(deadline=deadline, seed=0)
+    backend = CountingBackend(latency=latency, throttle_windows=throttle_windows)
+    converter = SubtitleToSpeechConverter(
+        backend=backend, scheduler=scheduler, use_cache=False, log=lambda message: None,
+        voice_models=VoiceModelStore(os.path.join(directory, "voice_models.json"))
+    )
+    output_file = os.path.join(directory, f"{name}.wav")
+    start = time.perf_counter()
+    result = converter.convert_batch([(srt_file, output_file)], "Synthetic-A", concurrency=concurrency,
+                                     resume=False)[0]
+    elapsed = time.perf_counter() - start
+    with open(output_file, "rb") as f:
+        audio = PcmAudio.from_wav(f.read())
+    print(f"{name:<10}{elapsed:7.2f}s  {scheduler.stats()}")
+    return result, audio, backend
+
+
+def slot_frames(audio, start, end):
+    return int(round(start * audio.frame_rate)), int(round(end * audio.frame_rate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cues", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per synthetic request")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--window", default="0.5,1.5",
+                        help="start,end of the throttle window in seconds after the first request")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    window = tuple(float(value) for value in args.window.split(","))
+    cues = make_roomy_cues(args.cues, args.seed)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        srt_file = os.path.join(directory, "roomy.srt")
+        write_srt(srt_file, cues)
+        # The clean run calibrates and stores the voice model, so the throttled
+        # runs send only conversion requests and the window lands on those
+        random.seed(args.seed)
+        clean_result, clean, _ = convert(directory, srt_file, "clean", args.latency, args.concurrency)
+        retried_result, retried, retried_backend = convert(
+            directory, srt_file, "retried", args.latency, args.concurrency, [window])
+        # A deadline shorter than the window makes the lines requested inside it fail
+        failed_result, failed, failed_backend = convert(
+            directory, srt_file, "deadline", args.latency, args.concurrency, [window],
+            deadline=(window[1] - window[0]) / 3)
+
+    for name, result in (("clean", clean_result), ("retried", retried_result), ("deadline", failed_result)):
+        if result is None or not result.completed:
+            failures.append(f"{name}: conversion did not complete")
+        elif result.cues != len(cues):
+            failures.append(f"{name}: {result.cues} of {len(cues)} cues processed")
+    if failures:
+        return report(failures)
+
+    if retried_result.failed:
+        failures.append(f"retried: {len(retried_result.failed)} cues failed despite the long deadline")
+    if not np.array_equal(retried.samples, clean.samples):
+        failures.append("retried: output differs from the undisturbed run")
+    if not failed_result.failed:
+        failures.append("deadline: no cue failed; the window did not outlast the deadline")
+
+    # Cues that were not reported as failed must have audio in their slot
+    failed_slots = {(cue.start, cue.end) for cue in failed_result.failed}
+    for start, end, _ in cues:
+        first, last = slot_frames(failed, start, end)
+        has_audio = np.any(failed.samples[first:last])
+        if any(abs(start - s) < 1e-3 and abs(end - e) < 1e-3 for s, e in failed_slots):
+            if has_audio:
+                failures.append(f"deadline: failed cue at {start:.2f}s is not silent")
+        elif not has_audio:
+            failures.append(f"deadline: cue at {start:.2f}s was lost")
+
+    # Outside the failed slots the output is the undisturbed one
+    keep = np.ones(min(len(clean.samples), len(failed.samples)), dtype=bool)
+    for cue in failed_result.failed:
+        first, last = slot_frames(failed, cue.start, cue.end)
+        keep[first:last] = False
+    if not np.array_equal(clean.samples[:len(keep)][keep], failed.samples[:len(keep)][keep]):
+        failures.append("deadline: audio outside the failed slots differs from the undisturbed run")
+    last_slot = cues[-1][1] - cues[-1][0]
+    if abs(clean.duration_seconds - failed.duration_seconds) > last_slot:
+        failures.append(f"deadline: output is {failed.duration_seconds:.2f}s instead of {clean.duration_seconds:.2f}s")
+
+    # The first refusals come back a latency into the window and the requests
+    # already sent drain within another; after that the halved limit holds
+    settle = max(3 * args.latency, 0.1)
+    for name, backend in (("retried", retried_backend), ("deadline", failed_backend)):
+        before, during = backend.peak(end=window[0]), backend.peak(window[0] + settle, window[1])
+        print(f"{name:<10}{backend.throttled} throttled responses, "
+              f"engine served up to {before} requests at once before the window, {during} inside it")
+        if before < args.concurrency:
+            failures.append(f"{name}: only {before} of {args.concurrency} requests were in flight before the window")
+        if during > args.concurrency // 2:
+            failures.append(f"{name}: {during} requests were in flight while the engine throttled")
+    print(f"deadline  {len(failed_result.failed)} cues left silent")
+    return report(failures)
+
+
+def report(failures):
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if not failures:
+        print("all checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
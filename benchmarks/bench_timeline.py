@@ -0,0 +1,68 @@
+"""Compares AudioSegment ``+=`` against TimelineBuilder for timeline assembly.
+
+Prints the mean per-cue cost for each block of cues; with TimelineBuilder the
+numbers should stay flat as the timeline grows.
+
+    python benchmarks/bench_timeline.py --cues 1800
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_timeline import TimelineBuilder
+
+
+def make_clip(seconds, frame_rate):
+    samples = (np.random.default_rng(0).standard_normal(int(seconds * frame_rate)) * 3000).astype(np.int16)
+    return AudioSegment(data=samples.tobytes(), sample_width=2, frame_rate=frame_rate, channels=1)
+
+
+def run_segment(clip, cues, block):
+    final_audio = AudioSegment.silent(duration=0, frame_rate=clip.frame_rate)
+    timings = []
+    start = time.perf_counter()
+    for i in range(cues):
+        final_audio += AudioSegment.silent(duration=300, frame_rate=clip.frame_rate) + clip
+        if (i + 1) % block == 0:
+            timings.append((time.perf_counter() - start) / block)
+            start = time.perf_counter()
+    return timings, final_audio
+
+
+def run_builder(clip, cues, block):
+    final_audio = TimelineBuilder()
+    timings = []
+    start = time.perf_counter()
+    for i in range(cues):
+        final_audio.append(clip, lead_silence=0.3)
+        if (i + 1) % block == 0:
+            timings.append((time.perf_counter() - start) / block)
+            start = time.perf_counter()
+    return timings, final_audio.to_segment()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cues", type=int, default=1800)
+    parser.add_argument("--block", type=int, default=200)
+    parser.add_argument("--clip-seconds", type=float, default=2.5)
+    parser.add_argument("--frame-rate", type=int, default=24000)
+    args = parser.parse_args()
+
+    clip = make_clip(args.clip_seconds, args.frame_rate)
+    for name, runner in (("AudioSegment +=", run_segment), ("TimelineBuilder", run_builder)):
+        start = time.perf_counter()
+        timings, audio = runner(clip, args.cues, args.block)
+        total = time.perf_counter() - start
+        per_block = " ".join(f"{t * 1000:.2f}" for t in timings)
+        print(f"{name:16s} total {total:7.2f}s  audio {audio.duration_seconds:8.1f}s")
+        print(f"{'':16s} ms/cue per {args.block} cues: {per_block}")
+
+
+if __name__ == "__main__":
+    main()
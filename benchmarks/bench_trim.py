@@ -0,0 +1,83 @@
+"""Checks the NumPy silence trimmer against pydub and times both.
+
+Generates speech-like clips (noise bursts shaped into syllables, with pauses,
+a low noise floor and padded edges), compares the trim points of
+``detect_nonsilent_bounds`` with pydub's ``detect_nonsilent`` and exits with
+an error if any differ by more than ``--tolerance`` milliseconds.
+
+    python benchmarks/bench_trim.py --clips 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from pydub.silence import detect_nonsilent
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_timeline import PcmAudio, detect_nonsilent_bounds
+
+
+def make_clip(rng, frame_rate, channels):
+    """A few seconds of syllable-shaped noise between quiet edges."""
+    parts = [rng.normal(0, 20, int(rng.uniform(0.02, 0.4) * frame_rate))]
+    for _ in range(rng.integers(3, 25)):
+        syllable = int(rng.uniform(0.08, 0.3) * frame_rate)
+        envelope = np.sin(np.linspace(0, np.pi, syllable)) * rng.uniform(1000, 12000)
+        parts.append(rng.normal(0, 1, syllable) * envelope)
+        if rng.random() < 0.3:
+            parts.append(rng.normal(0, 20, int(rng.uniform(0.03, 0.25) * frame_rate)))
+    parts.append(rng.normal(0, 20, int(rng.uniform(0.02, 0.6) * frame_rate)))
+    mono = np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16)
+    samples = np.repeat(mono, channels) if channels > 1 else mono
+    return PcmAudio(samples, frame_rate, channels)
+
+
+def pydub_bounds(audio):
+    ranges = detect_nonsilent(audio.to_segment(), silence_thresh=-40, min_silence_len=100)
+    if not ranges:
+        return None
+    return ranges[0][0], ranges[-1][1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", type=int, default=50)
+    parser.add_argument("--tolerance", type=int, default=1, help="allowed difference in milliseconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    formats = [(24000, 1), (22050, 1), (16000, 1), (24000, 2)]
+    clips = [make_clip(rng, *formats[i % len(formats)]) for i in range(args.clips)]
+    # Edge cases: silence only, shorter than the window, no silence at all
+    clips.append(PcmAudio(np.zeros(24000, dtype=np.int16), 24000))
+    clips.append(PcmAudio((rng.normal(0, 5000, 1200)).astype(np.int16), 24000))
+    clips.append(PcmAudio((rng.normal(0, 5000, 48000)).astype(np.int16), 24000))
+
+    pydub_time = numpy_time = 0.0
+    mismatches = 0
+    for audio in clips:
+        start = time.perf_counter()
+        expected = pydub_bounds(audio)
+        pydub_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = detect_nonsilent_bounds(audio)
+        numpy_time += time.perf_counter() - start
+
+        if (expected is None) != (actual is None) or (
+                expected and max(abs(e - a) for e, a in zip(expected, actual)) > args.tolerance):
+            mismatches += 1
+            print(f"mismatch on {len(audio)} ms clip: pydub {expected}, numpy {actual}")
+
+    audio_seconds = sum(audio.duration_seconds for audio in clips)
+    print(f"{len(clips)} clips, {audio_seconds:.1f}s of audio, {mismatches} mismatches")
+    print(f"pydub detect_nonsilent   {pydub_time * 1000 / len(clips):8.2f} ms/clip")
+    print(f"detect_nonsilent_bounds  {numpy_time * 1000 / len(clips):8.2f} ms/clip  ({pydub_time / numpy_time:.0f}x faster)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Benchmark suite: end-to-end conversions of synthetic corpora plus microbenchmarks.
+
+End-to-end cases convert generated SRT files of each size with the offline
+synthetic engine (``--latency`` seconds per request) and report subtitles per
+second, peak RSS and time per pipeline stage. Each case runs in its own
+process so that peak RSS belongs to that case alone. Microbenchmarks time rate
+solving, whole-file planning, SRT parsing and silence trimming.
+
+Results can be saved as a baseline and compared against on later runs; a
+metric that got worse by more than ``--threshold`` fails the run:
+
+    python benchmarks/run_benchmarks.py --save-baseline
+    python benchmarks/run_benchmarks.py --threshold 0.2
+
+Baselines depend on the machine, so keep one per host.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+from srt_corpus import make_corpus, make_cues
+
+DEFAULT_SIZES = [100, 1000, 5000, 20000]
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def best_of(function, repeat=5):
+    """Shortest of ``repeat`` timed calls, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_conversion(count, latency, concurrency, seed):
+    """Converts a generated file of ``count`` cues; runs inside the case's own process."""
+    from srt_to_audio_core import SubtitleToSpeechConverter
+    from tts_backends import SyntheticTTSBackend
+    from voice_calibration import VoiceModelStore
+
+    with tempfile.TemporaryDirectory() as directory:
+        srt_file = make_corpus(directory, count, seed, windows_style=count % 2 == 1)
+        converter = SubtitleToSpeechConverter(
+            backend=SyntheticTTSBackend(latency=latency, latency_jitter=latency / 2, seed=seed),
+            use_cache=False, voice_models=VoiceModelStore(os.path.join(directory, "voice_models.json")),
+            log=lambda message: None
+        )
+        voice = converter.find_voice("Synthetic-A")
+        # Calibrate up front so the timed run measures conversion only
+        converter.determine_voice_characteristics([srt_file], voice, "en-US")
+
+        start = time.perf_counter()
+        converter.convert([srt_file], os.path.join(directory, "output.wav"), voice.name,
+                          concurrency=concurrency, resume=False)
+        wall_seconds = time.perf_counter() - start
+
+    return {
+        "cues": count,
+        "wall_seconds": wall_seconds,
+        "cues_per_second": count / wall_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": converter.timings.summary(),
+    }
+
+
+def run_case_in_subprocess(count, args):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-case", str(count), "--latency", str(args.latency),
+         "--concurrency", str(args.concurrency), "--seed", str(args.seed)],
+        check=True, stdout=subprocess.PIPE, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_microbenchmarks(seed):
+    from audio_timeline import PcmAudio
+    from bench_trim import make_clip
+    from srt_index import iter_cues
+    from srt_to_audio_core import trim_silence
+    from synthesis_pipeline import CuePlanner, find_rate_for_cpm
+
+    cpm_model = np.poly1d([-120.0, 1150.0, -60.0])
+    targets = np.linspace(cpm_model(0.85), cpm_model(1.15), 1000)
+    find_rate = best_of(lambda: [find_rate_for_cpm(cpm_model, target) for target in targets]) / len(targets)
+
+    cues = make_cues(10000, seed)
+    planner = CuePlanner(cpm_model, 0.85, 1.15)
+    plan_all = best_of(lambda: planner.plan_all(cues, 0.0))
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(make_corpus(directory, 20000, seed), encoding="utf-8") as f:
+            lines = f.read().splitlines(keepends=True)
+    parse = best_of(lambda: sum(1 for _ in iter_cues(lines)))
+
+    rng = np.random.default_rng(seed)
+    clips = [make_clip(rng, 24000, 1) for _ in range(20)]
+    clips.append(PcmAudio(np.zeros(24000, dtype=np.int16), 24000))
+    trim = best_of(lambda: [trim_silence(clip) for clip in clips]) / len(clips)
+
+    return {
+        "find_rate_for_cpm_us": find_rate * 1e6,
+        "plan_all_10k_ms": plan_all * 1e3,
+        "parse_20k_ms": parse * 1e3,
+        "trim_silence_ms": trim * 1e3,
+    }
+
+
+def collect_metrics(results):
+    """Flattens results into ``{name: (value, higher_is_better)}``."""
+    metrics = {}
+    for case in results["conversions"]:
+        prefix = f"convert_{case['cues']}"
+        metrics[f"{prefix}.cues_per_second"] = (case["cues_per_second"], True)
+        if case["peak_rss_mb"] is not None:
+            metrics[f"{prefix}.peak_rss_mb"] = (case["peak_rss_mb"], False)
+    for name, value in results["micro"].items():
+        metrics[f"micro.{name}"] = (value, False)
+    return metrics
+
+
+def compare(metrics, baseline, threshold):
+    """Prints each metric against the baseline and returns the names that regressed."""
+    regressions = []
+    print(f"\n{'Metric':<36}{'value':>12}{'baseline':>12}{'change':>9}")
+    for name, (value, higher_is_better) in sorted(metrics.items()):
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<36}{value:>12.3f}{'-':>12}{'':>9}")
+            continue
+        # Positive change means worse, whichever direction the metric counts
+        change = (base / value - 1) if higher_is_better else (value / base - 1)
+        flag = "  REGRESSION" if change > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<36}{value:>12.3f}{base:>12.3f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def print_conversion(case):
+    rss = f"{case['peak_rss_mb']:.0f} MB" if case["peak_rss_mb"] is not None else "n/a"
+    print(f"\n{case['cues']} cues: {case['wall_seconds']:.2f}s, {case['cues_per_second']:.1f} cues/s, peak RSS {rss}")
+    for stage, stats in sorted(case["stages"].items(), key=lambda item: -item[1]["total"]):
+        print(f"  {stage:<18}{stats['total']:>8.2f}s  p50 {stats['p50'] * 1000:7.2f} ms  "
+              f"p95 {stats['p95'] * 1000:7.2f} ms  max {stats['max'] * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated cue counts of the end-to-end cases")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per synthetic request")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown against the baseline that fails the run")
+    parser.add_argument("--output", help="also write the full results as JSON to this file")
+    parser.add_argument("--run-case", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case is not None:
+        print(json.dumps(run_conversion(args.run_case, args.latency, args.concurrency, args.seed)))
+        return 0
+
+    results = {"conversions": [], "micro": {}}
+    for count in [int(size) for size in args.sizes.split(",") if size]:
+        case = run_case_in_subprocess(count, args)
+        results["conversions"].append(case)
+        print_conversion(case)
+    if not args.skip_micro:
+        results["micro"] = run_microbenchmarks(args.seed)
+
+    metrics = collect_metrics(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "host": platform.node(),
+                "python": platform.python_version(),
+                "latency": args.latency,
+                "concurrency": args.concurrency,
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "metrics": {name: value for name, (value, _) in metrics.items()},
+            }, f, indent=2)
+        compare(metrics, {}, args.threshold)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except OSError:
+        compare(metrics, {}, args.threshold)
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    if (baseline.get("latency"), baseline.get("concurrency")) != (args.latency, args.concurrency):
+        print("\nWarning: the baseline was recorded with different --latency/--concurrency")
+    regressions = compare(metrics, baseline["metrics"], args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Generates reproducible synthetic SRT files for benchmarks.
+
+Cues mix English, Spanish, German and Japanese lines with sentence, clause
+and no final punctuation, one or two lines of text, and varying pace, so
+that planning, pausing and trimming see the same variety as real subtitles.
+Some files use CRLF line endings and a byte order mark, as files from
+subtitle editors often do.
+"""
+import os
+import random
+
+PHRASES = {
+    "en": ["I told you we should have left earlier", "where are you going", "that is not what I meant",
+           "come on", "we need to talk about what happened yesterday", "thank you", "look out",
+           "nobody has been here for years", "it is going to rain tonight"],
+    "es": ["no sé lo que quieres decir", "vamos", "ya es demasiado tarde para eso", "gracias",
+           "¿dónde estabas anoche", "tenemos que irnos ahora mismo"],
+    "de": ["das habe ich nicht gesagt", "komm schon", "wir müssen darüber reden", "danke",
+           "es wird heute Nacht regnen"],
+    "ja": ["ちょっと待って", "どこへ行くの", "それは違うと思う", "ありがとう", "昨日のことを話さなければならない",
+           "もう遅すぎる"],
+}
+ENDINGS = {
+    "en": [".", ".", "?", "!", ",", "", "..."],
+    "es": [".", "?", "!", ",", ""],
+    "de": [".", "?", "!", ",", ""],
+    "ja": ["。", "。", "？", "！", "、", ""],
+}
+
+
+def format_timestamp(seconds):
+    milliseconds = int(round(seconds * 1000))
+    return (f"{milliseconds // 3600000:02}:{milliseconds // 60000 % 60:02}:"
+            f"{milliseconds // 1000 % 60:02},{milliseconds % 1000:03}")
+
+
+def make_cues(count, seed=0):
+    """Returns ``count`` cues as ``(start_seconds, end_seconds, text)``."""
+    rng = random.Random(seed)
+    languages = list(PHRASES)
+    cues = []
+    start = 1.0
+    for _ in range(count):
+        language = rng.choice(languages)
+        lines = []
+        for _ in range(1 if rng.random() < 0.7 else 2):
+            phrase = rng.choice(PHRASES[language])
+            lines.append(phrase[0].upper() + phrase[1:] + rng.choice(ENDINGS[language]))
+        text = "\n".join(lines)
+        # Roughly 12-20 characters per second, with some lines too dense to fit
+        duration = max(0.6, len(text) / rng.uniform(12, 20) + rng.uniform(-0.3, 0.8))
+        cues.append((start, start + duration, text))
+        start += duration + rng.choice([0.0, 0.1, 0.3, 0.8, 2.0])
+    return cues
+
+
+def write_srt(path, cues, crlf=False, bom=False):
+    newline = "\r\n" if crlf else "\n"
+    with open(path, "w", encoding="utf-8-sig" if bom else "utf-8", newline="") as f:
+        for number, (start, end, text) in enumerate(cues, 1):
+            block = [str(number), f"{format_timestamp(start)} --> {format_timestamp(end)}"] + text.split("\n")
+            f.write(newline.join(block) + newline + newline)
+
+
+def make_corpus(directory, count, seed=0, windows_style=False):
+    """Writes an SRT file of ``count`` cues to ``directory`` and returns its path.
+
+    ``windows_style`` writes CRLF line endings and a byte order mark.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"corpus_{count}_{seed}.srt")
+    write_srt(path, make_cues(count, seed), crlf=windows_style, bom=windows_style)
+    return path
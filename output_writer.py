@@ -0,0 +1,244 @@
+"""Streams the converted timeline to disk with a manifest for resuming.
+
+Finished cues are appended to ``<output>.partial.wav`` as they are placed, and
+each committed cue adds a line to ``<output>.manifest.jsonl`` recording its
+position, the timeline offset after it and the cache key of its audio. When a
+conversion with the same settings is started again, the partial file is cut
+back to the last committed cue and conversion continues from there; if the
+partial file is missing or shorter than the committed cues, it starts over.
+The final file is written once at the end: WAV by renaming, other formats
+with a single ffmpeg run.
+"""
+import json
+import os
+import struct
+import subprocess
+import wave
+
+import numpy as np
+
+from audio_timeline import PcmAudio, conform_samples
+
+MANIFEST_VERSION = 1
+WAV_HEADER_SIZE = 44
+
+
+class StreamingTimeline:
+    """Timeline with the TimelineBuilder interface that writes to disk as it grows.
+
+    Clips must be placed at or after the current end of the timeline, which is
+    how the converter fills it; only the samples of the clip being placed are
+    held in memory.
+    """
+
+    sample_width = 2
+
+    def __init__(self, output_file, job, resume=True, channels=1):
+        self.output_file = output_file
+        self.work_path = output_file + ".partial.wav"
+        self.manifest_path = output_file + ".manifest.jsonl"
+        self.job = dict(job, version=MANIFEST_VERSION)
+        self.channels = channels
+        self.frame_rate = None
+        self.frames = 0
+        self.entries = []
+        self._written_frames = 0
+        self._pending_silence = 0.0
+        self._wav = None
+
+        if resume and self._load_manifest() and self._audio_intact():
+            self._reopen()
+        else:
+            self.entries = []
+            self._start_fresh()
+        self._manifest = open(self.manifest_path, "a", encoding="utf-8")
+
+    # Manifest handling
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                lines = f.read().split("\n")
+        except OSError:
+            return False
+        try:
+            if json.loads(lines[0]) != self.job:
+                return False
+        except ValueError:
+            return False
+        for line in lines[1:]:
+            try:
+                self.entries.append(json.loads(line))
+            except ValueError:
+                # A torn last line from a crash; everything before it is intact
+                break
+        return True
+
+    def _audio_intact(self):
+        """Whether the partial file holds the audio of every committed cue.
+
+        Without any synthesized cue the committed timeline is silence, which
+        can be recreated; otherwise the file must reach the last offset.
+        """
+        if all("error" in entry for entry in self.entries):
+            return True
+        try:
+            with wave.open(self.work_path, "rb") as wf:
+                frame_rate = wf.getframerate()
+                frame_size = wf.getnchannels() * wf.getsampwidth()
+            # The header may predate the last commit, so count the frames on disk
+            frames = (os.path.getsize(self.work_path) - WAV_HEADER_SIZE) // frame_size
+        except (OSError, EOFError, wave.Error):
+            return False
+        return frames >= int(round(self.entries[-1]["offset"] * frame_rate))
+
+    def _start_fresh(self):
+        for path in (self.work_path, self.manifest_path):
+            if os.path.exists(path):
+                os.remove(path)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.job) + "\n")
+
+    def _reopen(self):
+        # Rewrite the manifest without a torn tail so later appends stay parseable
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.job) + "\n")
+            for entry in self.entries:
+                f.write(json.dumps(entry) + "\n")
+
+        offset = self.entries[-1]["offset"] if self.entries else 0.0
+        if not os.path.exists(self.work_path):
+            self._pending_silence = offset
+            return
+        with wave.open(self.work_path, "rb") as wf:
+            self.frame_rate = wf.getframerate()
+            self.channels = wf.getnchannels()
+        self.frames = self._written_frames = int(round(offset * self.frame_rate))
+        self._wav = open(self.work_path, "r+b")
+        self._wav.truncate(WAV_HEADER_SIZE + self.frames * self.channels * self.sample_width)
+        self._write_header()
+        self._wav.seek(0, os.SEEK_END)
+
+    @property
+    def resume_point(self):
+        """``(file_index, cue_index)`` of the last committed cue, or None."""
+        if not self.entries:
+            return None
+        return self.entries[-1]["file"], self.entries[-1]["cue"]
+
+    def file_start_offset(self, file_index):
+        """Timeline offset at which file ``file_index`` started, from the committed cues."""
+        offset = 0.0
+        for entry in self.entries:
+            if entry["file"] < file_index:
+                offset = entry["offset"]
+        return offset
+
+    def commit(self, file_index, cue_index, cache_key=None, error=None):
+        """Makes everything placed so far durable and records the cue in the manifest."""
+        if self._wav is not None:
+            self._write_silence(self.frames - self._written_frames)
+            self._write_header()
+            self._wav.seek(0, os.SEEK_END)
+            self._wav.flush()
+        entry = {"file": file_index, "cue": cue_index, "offset": self.duration_seconds, "key": cache_key}
+        if error is not None:
+            entry["error"] = str(error)
+        self.entries.append(entry)
+        self._manifest.write(json.dumps(entry) + "\n")
+        self._manifest.flush()
+
+    # Timeline interface
+
+    def __len__(self):
+        return int(self.duration_seconds * 1000)
+
+    @property
+    def duration_seconds(self):
+        if not self.frame_rate:
+            return self._pending_silence
+        return self.frames / self.frame_rate
+
+    def _seconds_to_frames(self, seconds):
+        return int(round(seconds * self.frame_rate))
+
+    def _open_wav(self, clip):
+        self.frame_rate = clip.frame_rate
+        self.channels = clip.channels
+        self.frames = self._seconds_to_frames(self._pending_silence)
+        self._wav = open(self.work_path, "w+b")
+        self._write_header()
+        self._wav.seek(0, os.SEEK_END)
+
+    def _write_header(self):
+        data_size = self._written_frames * self.channels * self.sample_width
+        byte_rate = self.frame_rate * self.channels * self.sample_width
+        self._wav.seek(0)
+        self._wav.write(b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE")
+        self._wav.write(b"fmt " + struct.pack("<IHHIIHH", 16, 1, self.channels, self.frame_rate, byte_rate,
+                                              self.channels * self.sample_width, 8 * self.sample_width))
+        self._wav.write(b"data" + struct.pack("<I", data_size))
+
+    def _write_silence(self, frames):
+        block = 1 << 16
+        while frames > 0:
+            take = min(frames, block)
+            self._wav.write(bytes(take * self.channels * self.sample_width))
+            frames -= take
+            self._written_frames += take
+
+    def place(self, clip, offset_seconds):
+        """Writes ``clip`` at ``offset_seconds``, which must not precede the end."""
+        if self._wav is None:
+            self._open_wav(clip)
+        samples = conform_samples(clip, self.frame_rate, self.channels)
+        offset_frames = self._seconds_to_frames(offset_seconds)
+        if offset_frames < self._written_frames:
+            raise ValueError("Clips must be placed at or after the end of a streamed timeline")
+
+        self._write_silence(offset_frames - self._written_frames)
+        self._wav.write(samples.tobytes())
+        self._written_frames += len(samples) // self.channels
+        self.frames = max(self.frames, self._written_frames)
+
+    def append(self, clip, lead_silence=0.0):
+        self.place(clip, self.duration_seconds + lead_silence)
+
+    def append_silence(self, seconds):
+        if self._wav is None:
+            self._pending_silence += seconds
+            return
+        self.frames += self._seconds_to_frames(seconds)
+
+    def pad_to(self, seconds):
+        if seconds > self.duration_seconds:
+            self.append_silence(seconds - self.duration_seconds)
+
+    # Output
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+        self._manifest.close()
+
+    def finish(self, format="mp3"):
+        """Writes the final output file and removes the partial file and manifest."""
+        if self._wav is None:
+            # Nothing was ever synthesized; write the silence the timeline spans
+            self._open_wav(PcmAudio(np.zeros(0, dtype=np.int16), 24000))
+        self._write_silence(self.frames - self._written_frames)
+        self._write_header()
+        self.close()
+
+        if format == "wav":
+            os.replace(self.work_path, self.output_file)
+        else:
+            from pydub import AudioSegment
+            subprocess.run(
+                [AudioSegment.converter, "-y", "-loglevel", "error", "-i", self.work_path,
+                 "-f", format, self.output_file],
+                check=True
+            )
+            os.remove(self.work_path)
+        os.remove(self.manifest_path)
@@ -0,0 +1,260 @@
+"""Admission control and retries for speech synthesis requests.
+
+Every request to the engine goes through a RequestScheduler, which
+
+- waits for a slot under an adaptive concurrency limit. The limit starts at,
+  and never exceeds, the concurrency the caller asked for. It grows by one
+  after a full window of successful requests sent while it was holding
+  requests back, and halves when the engine reports throttling (additive
+  increase, multiplicative decrease), so the scheduler settles just under
+  the quota instead of hammering it;
+- takes tokens from per-minute buckets for requests and for characters, so
+  configured quotas are respected before the engine has to refuse anything;
+- retries throttled and transient failures after an exponentially growing,
+  fully jittered delay, so that requests refused together do not come back
+  together, until the request's deadline has passed.
+
+Errors are classified by their ``code`` attribute, which Google API
+exceptions carry as the HTTP status: 429 is throttling, 500/502/503/504 are
+transient, anything else fails at once.
+"""
+import itertools
+import random
+import threading
+import time
+
+THROTTLING_CODES = {429}
+TRANSIENT_CODES = {500, 502, 503, 504}
+
+
+def error_code(error):
+    try:
+        return int(getattr(error, "code", None))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttling_error(error):
+    return error_code(error) in THROTTLING_CODES or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def is_transient_error(error):
+    return error_code(error) in TRANSIENT_CODES or isinstance(error, (ConnectionError, TimeoutError))
+
+
+class DeadlineExceeded(RuntimeError):
+    """A request could not be completed before its deadline."""
+
+
+class TokenBucket:
+    """Refills at ``per_minute`` tokens a minute, holding at most ``capacity``.
+
+    ``capacity`` defaults to a sixth of the per-minute rate (ten seconds'
+    worth), which allows short bursts without exceeding the quota over any
+    minute.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60
+        self.capacity = capacity if capacity is not None else max(1.0, per_minute / 6)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1, deadline=None):
+        """Takes ``amount`` tokens, waiting for them; returns False if ``deadline`` comes first.
+
+        Requests larger than the capacity wait for a full bucket and overdraw
+        it: the balance goes negative, and later callers wait until the debt
+        is paid back, so the per-minute rate holds for large requests too.
+        """
+        needed = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return True
+                wait = (needed - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def refund(self, amount=1):
+        """Returns tokens taken for a request that was not sent after all."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class AdaptiveLimit:
+    """Concurrency limit adjusted by additive increase, multiplicative decrease."""
+
+    def __init__(self, initial=4, minimum=1, maximum=32):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._cooldown_until = 0.0
+        self._condition = threading.Condition()
+
+    def reset(self, maximum):
+        """Starts over at ``maximum``, which becomes the new cap."""
+        with self._condition:
+            self.maximum = max(self.minimum, maximum)
+            self.limit = self.maximum
+            self._successes = 0
+            self._cooldown_until = 0.0
+            self._condition.notify_all()
+
+    def acquire(self, deadline=None):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    return False
+                self._condition.wait(timeout)
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        """Counts a success of a request still holding its slot.
+
+        Only successes while every slot is taken show that the limit holds
+        requests back; those within the cooldown of a decrease were mostly
+        sent under the old limit and say nothing about the new one.
+        """
+        with self._condition:
+            if self.in_flight < self.limit or time.monotonic() < self._cooldown_until:
+                return
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify()
+
+    def on_throttled(self, cooldown=1.0):
+        """Halves the limit; throttling reported within ``cooldown`` seconds of the last decrease is one event."""
+        with self._condition:
+            now = time.monotonic()
+            self._successes = 0
+            if now - self._last_decrease >= cooldown:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._last_decrease = now
+                self._cooldown_until = now + cooldown
+
+
+class RequestScheduler:
+    """Runs synthesis requests under rate limits, adaptive concurrency and retries.
+
+    ``requests_per_minute`` and ``characters_per_minute`` are the engine's
+    quotas (None for no limit). A request is retried until ``deadline``
+    seconds after it was submitted, or at most ``max_attempts`` times if that
+    is set. Conversions call ``set_concurrency`` with the number of requests
+    they keep in flight, which the adaptive limit starts at and never exceeds.
+    """
+
+    def __init__(self, requests_per_minute=None, characters_per_minute=None, concurrency=8,
+                 max_attempts=None, base_delay=0.5, max_delay=20.0, deadline=120.0, seed=None):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.character_bucket = TokenBucket(characters_per_minute) if characters_per_minute else None
+        self.limit = AdaptiveLimit(concurrency, 1, concurrency)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def set_concurrency(self, concurrency):
+        self.limit.reset(concurrency)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _backoff(self, attempt):
+        with self._lock:
+            return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _admit(self, characters, deadline):
+        # Tokens are only spent on requests that are sent; a later wait that
+        # times out gives back what was already taken
+        if self.request_bucket and not self.request_bucket.acquire(1, deadline):
+            return False
+        if self.character_bucket and not self.character_bucket.acquire(characters, deadline):
+            if self.request_bucket:
+                self.request_bucket.refund(1)
+            return False
+        if not self.limit.acquire(deadline):
+            if self.request_bucket:
+                self.request_bucket.refund(1)
+            if self.character_bucket:
+                self.character_bucket.refund(characters)
+            return False
+        return True
+
+    def call(self, function, characters=0, deadline=None):
+        """Returns ``function()``, retrying throttled and transient failures.
+
+        Raises the last error once the deadline or attempts run out,
+        DeadlineExceeded if the deadline passes before a first attempt could be
+        made, and any other error straight away.
+        """
+        seconds = self.deadline if deadline is None else deadline
+        deadline = time.monotonic() + seconds
+        last_error = None
+        for attempt in itertools.count():
+            if not self._admit(characters, deadline):
+                break
+            self._count("requests")
+            try:
+                result = function()
+            except Exception as e:
+                self.limit.release()
+                if is_throttling_error(e):
+                    self._count("throttled")
+                    self.limit.on_throttled()
+                elif not is_transient_error(e):
+                    self._count("failures")
+                    raise
+                last_error = e
+            else:
+                # Counted while the slot is still held, so a limit that was full is seen as full
+                self.limit.on_success()
+                self.limit.release()
+                return result
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self.max_attempts and attempt + 1 >= self.max_attempts):
+                break
+            self._count("retries")
+            # Never sleep past the deadline; the last attempt happens just before it
+            time.sleep(min(self._backoff(attempt), remaining))
+
+        self._count("failures")
+        if last_error is not None:
+            raise last_error
+        raise DeadlineExceeded(f"Request not admitted within {seconds:g}s")
+
+    def stats(self):
+        return (
+            f"Requests: {self.requests} sent, {self.retries} retried, {self.throttled} throttled, "
+            f"{self.failures} failed; concurrency limit {self.limit.limit}"
+        )
@@ -0,0 +1,113 @@
+"""Line-oriented SRT parsing with a per-file cue index.
+
+Files are read in one pass, line by line. Parsing tolerates what real
+subtitle files contain: a byte order mark, CRLF or CR line endings, several
+or whitespace-only blank lines between cues, a missing blank line before the
+next cue, a missing final newline, ``.`` instead of ``,`` before the
+milliseconds and position coordinates after the end time. Cues without text
+are left out, since there is nothing to speak.
+
+Parsed files are kept in memory keyed by path and checked against the file's
+size and modification time, so a file read for calibration is not parsed
+again for conversion.
+"""
+import os
+import random
+import re
+import threading
+from collections import namedtuple
+
+Cue = namedtuple("Cue", ["number", "start", "end", "text"])
+
+TIMING_PATTERN = re.compile(
+    r"^\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})"
+)
+
+_index = {}
+_index_lock = threading.Lock()
+
+
+def _seconds(hours, minutes, seconds, fraction):
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(fraction.ljust(3, "0")) / 1000
+
+
+def iter_cues(lines):
+    """Yields a Cue for every subtitle in ``lines``, an iterable of text lines."""
+    number = None
+    timing = None
+    text = []
+
+    def finish():
+        cue_text = "\n".join(text).strip()
+        if cue_text:
+            return Cue(number, timing[0], timing[1], cue_text)
+        return None
+
+    for line in lines:
+        line = line.strip().lstrip("\ufeff")
+        match = TIMING_PATTERN.match(line)
+        if match:
+            if timing is not None:
+                # No blank line before this cue; its number ended up as a text line
+                next_number = int(text.pop()) if text and text[-1].isdigit() else None
+                cue = finish()
+                if cue:
+                    yield cue
+                number = next_number
+            groups = match.groups()
+            timing = (_seconds(*groups[:4]), _seconds(*groups[4:]))
+            text = []
+        elif not line:
+            if timing is not None:
+                cue = finish()
+                if cue:
+                    yield cue
+            number, timing, text = None, None, []
+        elif timing is not None:
+            text.append(line)
+        elif line.isdigit():
+            number = int(line)
+
+    if timing is not None:
+        cue = finish()
+        if cue:
+            yield cue
+
+
+def load_cues(srt_file):
+    """Returns the cues of ``srt_file`` as a tuple, parsing it only when it has changed."""
+    path = os.path.abspath(srt_file)
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _index_lock:
+        cached = _index.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    # Text mode turns CRLF and lone CR line endings into "\n"
+    with open(path, "r", encoding="utf-8-sig") as f:
+        cues = tuple(iter_cues(f))
+    with _index_lock:
+        _index[path] = (signature, cues)
+    return cues
+
+
+def sample_cue_texts(srt_files, count, min_length=5, rng=random):
+    """Picks ``count`` cue texts of at least ``min_length`` characters uniformly across the files.
+
+    Uses reservoir sampling, so only ``count`` texts are held at a time.
+    """
+    reservoir = []
+    seen = 0
+    for srt_file in srt_files:
+        for cue in load_cues(srt_file):
+            if len(cue.text) < min_length:
+                continue
+            seen += 1
+            if len(reservoir) < count:
+                reservoir.append(cue.text)
+            else:
+                slot = rng.randrange(seen)
+                if slot < count:
+                    reservoir[slot] = cue.text
+    return reservoir
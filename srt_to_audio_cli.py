@@ -0,0 +1,121 @@
+"""Command line entry point for converting subtitles without the GUI.
+
+    python srt_to_audio_cli.py episode01.srt -o episode01.mp3 --voice en-US-Wavenet-D
+    python srt_to_audio_cli.py season1/*.srt --output-dir audio --jobs 3 --voice en-US-Wavenet-D
+"""
+import argparse
+import os
+import sys
+
+from request_scheduler import RequestScheduler
+from srt_to_audio_core import SubtitleToSpeechConverter, log_job_progress
+from tts_backends import GoogleTTSBackend, SyntheticTTSBackend
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Convert SRT subtitle files to speech.")
+    parser.add_argument("srt_files", nargs="*", help="SRT files, converted in order into one output")
+    parser.add_argument("-o", "--output", help="output audio file (format taken from the extension)")
+    parser.add_argument("--output-dir", help="convert each SRT file into its own output in this directory")
+    parser.add_argument("--format", default="mp3", help="audio format of the outputs written to --output-dir")
+    parser.add_argument("--jobs", type=int, default=2, help="files converted at the same time with --output-dir")
+    parser.add_argument("--max-requests", type=int,
+                        help="synthesis requests in flight across all files with --output-dir")
+    parser.add_argument("--voice", help="voice name, e.g. en-US-Wavenet-D")
+    parser.add_argument("--language-code", help="language code (defaults to the voice's first)")
+    parser.add_argument("--min-rate", type=float, default=0.85, help="minimum speaking rate")
+    parser.add_argument("--max-rate", type=float, default=1.15, help="maximum speaking rate")
+    parser.add_argument("--pitch", type=float, default=0, help="voice pitch")
+    parser.add_argument("--spread-lag", type=int, default=1,
+                        help="share making up accumulated lag across this many upcoming subtitles")
+    parser.add_argument("--concurrency", type=int, default=4, help="synthesis requests kept in flight")
+    parser.add_argument("--coalesce", action="store_true",
+                        help="speak runs of subtitles planned at the same rate in one SSML request each")
+    parser.add_argument("--backend", choices=["google", "synthetic"], default="google",
+                        help="speech engine; 'synthetic' generates tones offline for testing and benchmarks")
+    parser.add_argument("--synthetic-latency", type=float, default=0.0, help="seconds each synthetic request takes")
+    parser.add_argument("--synthetic-failure-rate", type=float, default=0.0, help="fraction of synthetic requests that fail")
+    parser.add_argument("--synthetic-quota", type=int, help="requests per minute the synthetic engine accepts")
+    parser.add_argument("--synthetic-no-timepoints", action="store_true",
+                        help="make the synthetic engine report no SSML mark timepoints")
+    parser.add_argument("--requests-per-minute", type=int, help="request quota of the engine")
+    parser.add_argument("--characters-per-minute", type=int, help="character quota of the engine")
+    parser.add_argument("--request-deadline", type=float, default=120.0,
+                        help="seconds to keep retrying a throttled subtitle before leaving it silent")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the synthesis cache")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="start over instead of resuming an interrupted conversion of the same output")
+    parser.add_argument("--recalibrate", action="store_true", help="measure the voice again instead of using the stored model")
+    parser.add_argument("--trace", help="write stage timings as a Chrome trace (JSON) to this file")
+    parser.add_argument("--debug", action="store_true", help="print per-subtitle debugging information")
+    parser.add_argument("--quiet", action="store_true", help="only print errors")
+    parser.add_argument("--list-voices", action="store_true", help="list available voices and exit")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.backend == "synthetic":
+        backend = SyntheticTTSBackend(latency=args.synthetic_latency, failure_rate=args.synthetic_failure_rate,
+                                      quota_per_minute=args.synthetic_quota,
+                                      report_timepoints=not args.synthetic_no_timepoints)
+    else:
+        backend = GoogleTTSBackend()
+    scheduler = RequestScheduler(
+        requests_per_minute=args.requests_per_minute, characters_per_minute=args.characters_per_minute,
+        deadline=args.request_deadline
+    )
+
+    log = (lambda message: None) if args.quiet else (lambda message: print(message, end="", flush=True))
+    converter = SubtitleToSpeechConverter(
+        backend=backend, use_cache=not args.no_cache, scheduler=scheduler, log=log
+    )
+    converter.advanced_debug = args.debug
+
+    if args.list_voices:
+        for voice in converter.get_available_voices():
+            print(f"{voice.name}\t{', '.join(voice.language_codes)}")
+        return 0
+
+    if not args.srt_files or not (args.output or args.output_dir) or not args.voice:
+        parser.error("SRT files, --output or --output-dir, and --voice are required")
+
+    try:
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            jobs = [
+                (srt_file, os.path.join(args.output_dir, os.path.splitext(os.path.basename(srt_file))[0] + "." + args.format))
+                for srt_file in args.srt_files
+            ]
+            results = converter.convert_batch(
+                jobs, args.voice,
+                min_rate=args.min_rate, max_rate=args.max_rate, pitch=args.pitch,
+                concurrency=args.concurrency, workers=args.jobs, max_requests=args.max_requests,
+                refresh_calibration=args.recalibrate, language_code=args.language_code,
+                resume=not args.no_resume, job_progress=None if args.quiet else log_job_progress(jobs, log),
+                spread_lag=args.spread_lag, coalesce=args.coalesce
+            )
+            return 0 if all(result is not None and result.completed for result in results) else 1
+        converter.convert(
+            args.srt_files, args.output, args.voice,
+            min_rate=args.min_rate, max_rate=args.max_rate, pitch=args.pitch,
+            concurrency=args.concurrency, refresh_calibration=args.recalibrate,
+            language_code=args.language_code, resume=not args.no_resume,
+            spread_lag=args.spread_lag, coalesce=args.coalesce
+        )
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        converter.stopped = True
+        return 130
+    finally:
+        if args.trace:
+            converter.timings.export(args.trace)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
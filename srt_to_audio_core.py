@@ -0,0 +1,602 @@
+"""GUI-free conversion core shared by the Tk app and the command line.
+
+Importing this module only pulls in the standard library; pydub, NumPy, SciPy
+and the Google Cloud client are imported the first time they are needed, so
+batch scripts start quickly and never touch tkinter, matplotlib or pyaudio.
+"""
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+
+from request_scheduler import DeadlineExceeded, RequestScheduler, is_throttling_error, is_transient_error
+from srt_index import load_cues, sample_cue_texts
+from stage_timing import StageTimer
+from synthesis_cache import SynthesisCache, quantize_rate, synthesis_key
+from tts_backends import GoogleTTSBackend, SynthesisResult, audio_duration, build_marked_ssml, mark_name
+
+
+ConversionResult = namedtuple("ConversionResult", ["completed", "cues", "audio_seconds", "wall_seconds", "failed"])
+FailedCue = namedtuple("FailedCue", ["srt_file", "subtitle", "start", "end", "error"])
+
+# Cache entries cut from coalesced requests are kept apart from whole requests:
+# they lack the engine's padding, which calibration measurements include
+COALESCED_ENCODING = "LINEAR16/coalesced"
+# Coalesced requests rejected in a row before a conversion stops sending them
+MAX_COALESCED_REJECTIONS = 3
+
+
+def parse_srt(srt_file):
+    """Returns the cues of ``srt_file`` with start and end times in seconds."""
+    return load_cues(srt_file)
+
+
+def get_random_subtitle_lines(srt_files, num_lines):
+    return sample_cue_texts(srt_files, num_lines)
+
+
+def trim_silence(audio):
+    """Trims silence from the beginning and end of a PcmAudio clip."""
+    from audio_timeline import detect_nonsilent_bounds
+
+    bounds = detect_nonsilent_bounds(audio, min_silence_len=100, silence_thresh=-40)
+    if bounds:
+        start_trim, end_trim = bounds
+        audio = audio[start_trim:end_trim]
+    return audio
+
+
+def log_job_progress(jobs, log, step=10):
+    """A ``job_progress`` callback for ``convert_batch`` that logs each job's progress every ``step`` percent."""
+    logged = [0] * len(jobs)
+
+    def job_progress(index, percentage):
+        # Each job reports from its own worker thread, so its entry needs no lock
+        reached = int(percentage // step) * step
+        if reached > logged[index]:
+            logged[index] = reached
+            log(f"{os.path.basename(jobs[index][0])}: {reached}%\n")
+
+    return job_progress
+
+
+class SubtitleToSpeechConverter:
+    """Converts SRT files to speech without any user interface.
+
+    Speech comes from ``backend`` (Google Cloud by default, see tts_backends).
+    ``log`` receives debug text, ``progress`` the percentage of the current
+    file done and ``voice_model_ready`` the VoiceModel used for a conversion.
+    ``pause``, ``resume`` and ``stop`` (or setting ``paused`` or ``stopped``)
+    may be called from another thread; a paused conversion blocks on an event
+    rather than polling. Independent converters share nothing but the on-disk
+    caches, so several can run side by side in threads or processes.
+    ``timings`` is a StageTimer that records where the time of each
+    conversion goes; it is reset when a conversion starts. Engine requests
+    go through ``scheduler`` (see request_scheduler), which applies quotas
+    and retries throttled requests. Conversions with ``coalesce`` speak runs
+    of subtitles planned at the same rate in one SSML request each (see
+    ``synthesize_coalesced``).
+    """
+
+    def __init__(self, backend=None, synthesis_cache=None, voice_models=None, use_cache=True,
+                 log=print, progress=None, voice_model_ready=None, timings=None, scheduler=None):
+        self.backend = backend if backend is not None else GoogleTTSBackend()
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.timings = timings if timings is not None else StageTimer()
+        if synthesis_cache is None and use_cache:
+            synthesis_cache = SynthesisCache()
+        self.synthesis_cache = synthesis_cache
+        self._voice_models = voice_models
+        self.log = log
+        self.progress = progress
+        self.voice_model_ready = voice_model_ready
+        self.advanced_debug = False
+        self._running = threading.Event()
+        self._running.set()
+        self._stop = threading.Event()
+        self._voices = None
+        self._request_slots = None
+        self._coalesced_rejections = 0
+        self._coalesced_lock = threading.Lock()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @paused.setter
+    def paused(self, value):
+        if value:
+            self._running.clear()
+        else:
+            self._running.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    @stopped.setter
+    def stopped(self, value):
+        if value:
+            self.stop()
+        else:
+            self._stop.clear()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def stop(self):
+        self._stop.set()
+        # Wake a paused conversion so it can see the stop
+        self._running.set()
+
+    @property
+    def voice_models(self):
+        if self._voice_models is None:
+            from voice_calibration import VoiceModelStore
+            self._voice_models = VoiceModelStore()
+        return self._voice_models
+
+    def get_available_voices(self):
+        if self._voices is None:
+            self._voices = self.backend.list_voices()
+        return self._voices
+
+    def find_voice(self, voice_name):
+        return next((v for v in self.get_available_voices() if v.name == voice_name), None)
+
+    def synthesize(self, text, voice, language_code, rate, pitch, audio_encoding):
+        """Returns a SynthesisResult for a request, served from the synthesis cache when possible.
+
+        ``audio_encoding`` is the name of a ``texttospeech.AudioEncoding`` member,
+        e.g. ``"MP3"`` or ``"LINEAR16"``.
+        """
+        rate = quantize_rate(rate)
+        if self.synthesis_cache is None:
+            return self._request(text, voice, language_code, rate, pitch, audio_encoding)
+
+        key = self.synthesis_key(text, voice, language_code, rate, pitch, audio_encoding)
+        with self.timings.span("cache_read"):
+            audio_content = self.synthesis_cache.get(key)
+        if audio_content is not None:
+            return SynthesisResult(audio_content, audio_duration(audio_content, audio_encoding), cached=True)
+
+        result = self._request(text, voice, language_code, rate, pitch, audio_encoding)
+        with self.timings.span("cache_write"):
+            self.synthesis_cache.put(key, result.audio_content)
+        return result
+
+    def _request(self, text, voice, language_code, rate, pitch, audio_encoding):
+        return self._schedule(
+            lambda: self.backend.synthesize(text, voice, language_code, rate, pitch, audio_encoding), len(text)
+        )
+
+    def _schedule(self, request, characters):
+        def attempt():
+            with self.timings.span("tts_request"):
+                return request()
+
+        slots = self._request_slots
+        if slots is None:
+            return self.scheduler.call(attempt, characters)
+        # Batch conversions share one limit on requests in flight
+        with self.timings.span("request_slot_wait"):
+            slots.acquire()
+        try:
+            return self.scheduler.call(attempt, characters)
+        finally:
+            slots.release()
+
+    def synthesize_coalesced(self, texts, voice, language_code, rate, pitch):
+        """Speaks ``texts`` in one SSML request; returns ``(clip, coalesced)`` per text.
+
+        ``clip`` is an untrimmed PcmAudio and ``coalesced`` tells whether it
+        was cut from a coalesced request (cached under COALESCED_ENCODING)
+        rather than synthesized on its own (cached as LINEAR16). The audio is
+        cut at the engine's mark timepoints, or in the middle of the longest
+        pauses when the engine reports none. Clips are cached one per text, so
+        only texts missing from the cache are requested, and a single missing
+        text is requested on its own. If the engine rejects the request or its
+        audio cannot be cut into one clip per text, the missing texts are
+        synthesized one request each; their failures are returned in place of
+        the pair rather than raised. After MAX_COALESCED_REJECTIONS rejections
+        in a row, every text is requested on its own until the next
+        conversion starts. Throttling and transient errors that outlast the
+        scheduler's retries are raised, as they would be for a single request.
+        """
+        from audio_timeline import PcmAudio, split_at_offsets, split_at_pauses
+
+        rate = quantize_rate(rate)
+        keys = [self.synthesis_key(text, voice, language_code, rate, pitch, COALESCED_ENCODING) for text in texts]
+        clips = [None] * len(texts)
+        if self.synthesis_cache is not None:
+            with self.timings.span("cache_read"):
+                cached = [self.synthesis_cache.get(key) for key in keys]
+            with self.timings.span("decode"):
+                clips = [(PcmAudio.from_wav(content), True) if content is not None else None for content in cached]
+        missing = [i for i, clip in enumerate(clips) if clip is None]
+
+        with self._coalesced_lock:
+            coalescing = self._coalesced_rejections < MAX_COALESCED_REJECTIONS
+        pieces = None
+        if len(missing) > 1 and coalescing:
+            ssml = build_marked_ssml([texts[i] for i in missing])
+            try:
+                result = self._schedule(
+                    lambda: self.backend.synthesize_ssml(ssml, voice, language_code, rate, pitch, "LINEAR16"),
+                    len(ssml)
+                )
+            except Exception as e:
+                if is_throttling_error(e) or is_transient_error(e) or isinstance(e, DeadlineExceeded):
+                    raise
+                # Batch jobs run in threads and share the count
+                with self._coalesced_lock:
+                    self._coalesced_rejections += 1
+                    rejections = self._coalesced_rejections
+                self.log(f"Coalesced request rejected ({e}); synthesizing its {len(missing)} subtitles one by one\n")
+                if rejections == MAX_COALESCED_REJECTIONS:
+                    self.log("Too many coalesced requests rejected; not coalescing for the rest of this conversion\n")
+            else:
+                with self._coalesced_lock:
+                    if self._coalesced_rejections < MAX_COALESCED_REJECTIONS:
+                        self._coalesced_rejections = 0
+                with self.timings.span("decode"):
+                    audio = PcmAudio.from_wav(result.audio_content)
+                with self.timings.span("split"):
+                    if result.timepoints is not None and all(mark_name(n) in result.timepoints for n in range(len(missing))):
+                        pieces = split_at_offsets(audio, [result.timepoints[mark_name(n)] for n in range(len(missing))])
+                    else:
+                        pieces = split_at_pauses(audio, len(missing))
+                if pieces is not None and self.synthesis_cache is not None:
+                    with self.timings.span("cache_write"):
+                        for i, piece in zip(missing, pieces):
+                            self.synthesis_cache.put(keys[i], piece.to_wav())
+                if pieces is not None:
+                    pieces = [(piece, True) for piece in pieces]
+
+        if pieces is None:
+            pieces = []
+            for i in missing:
+                try:
+                    result = self.synthesize(texts[i], voice, language_code, rate, pitch, "LINEAR16")
+                except Exception as e:
+                    pieces.append(e)
+                    continue
+                with self.timings.span("decode"):
+                    pieces.append((PcmAudio.from_wav(result.audio_content), False))
+        for i, piece in zip(missing, pieces):
+            clips[i] = piece
+        return clips
+
+    def synthesis_key(self, text, voice, language_code, rate, pitch, audio_encoding):
+        return synthesis_key(text, voice.name, language_code, rate, pitch, audio_encoding, self.backend.cache_namespace)
+
+    def cache_stats(self):
+        return self.synthesis_cache.stats() if self.synthesis_cache is not None else "Synthesis cache disabled"
+
+    def determine_voice_characteristics(self, srt_files, voice, language_code, pitch=0, refresh=False):
+        model = None if refresh else self.voice_models.get(voice.name, language_code, pitch)
+        if model is None:
+            with self.timings.span("calibration"):
+                model = self.calibrate_voice(srt_files, voice, language_code, pitch)
+                self.voice_models.put(voice.name, language_code, pitch, model)
+        else:
+            self.log(f"Using stored voice model for {voice.name} (calibrated {model.age_days():.1f} days ago, {len(model.measured_samples)} measured samples)\n")
+
+        if self.voice_model_ready:
+            self.voice_model_ready(model)
+        return model
+
+    def calibrate_voice(self, srt_files, voice, language_code, pitch=0):
+        from audio_timeline import PcmAudio
+        from voice_calibration import VoiceModel
+
+        test_texts = get_random_subtitle_lines(srt_files, 2)
+        rates = [0.5, 0.75, 1.0, 1.5, 2.0]
+        cpm_data = []
+
+        for rate in rates:
+            for text in test_texts:
+                try:
+                    result = self.synthesize(text, voice, language_code, rate, pitch, "LINEAR16")
+                    duration = result.duration
+                    if duration is None:
+                        duration = PcmAudio.from_wav(result.audio_content).duration_seconds
+                    cpm = len(text) / (duration / 60)
+                    cpm_data.append((rate, cpm))
+                except Exception as e:
+                    self.log(f"Error during voice characteristics determination: {e}\n")
+                    continue
+
+        return VoiceModel(cpm_data)
+
+    def convert(self, srt_files, output_file, voice_name, min_rate=0.85, max_rate=1.15, pitch=0,
+                concurrency=4, refresh_calibration=False, language_code=None, resume=True, spread_lag=1,
+                coalesce=False):
+        """Converts ``srt_files`` into one audio file at ``output_file``.
+
+        Files follow each other on one timeline: each file's subtitle times are
+        counted from where the previous file's audio ends. Audio is streamed to
+        a partial file next to the output as cues finish. With ``resume``, an
+        interrupted conversion of the same files with the same settings
+        continues after its last finished cue. ``spread_lag`` shares making up
+        accumulated lag across that many upcoming subtitles (see CuePlanner).
+        With ``coalesce``, runs of subtitles planned at the same rate are spoken
+        in one request each and cut apart again.
+
+        Returns True if the output was written, False if the conversion was stopped.
+        """
+        voice, language_code = self._resolve_voice(voice_name, language_code)
+        self.stopped = False
+        self.timings.reset()
+        self.scheduler.set_concurrency(concurrency)
+        with self._coalesced_lock:
+            self._coalesced_rejections = 0
+
+        # Determine voice speaking characteristics
+        cpm_model = self.determine_voice_characteristics(
+            srt_files, voice, language_code, pitch, refresh=refresh_calibration
+        ).cpm_model
+
+        result = self._convert(srt_files, output_file, voice, language_code, cpm_model,
+                               min_rate, max_rate, pitch, concurrency, resume, self.progress, spread_lag, coalesce)
+        self.log(f"Stage timings:\n{self.timings.format_summary()}\n")
+        return result.completed
+
+    def convert_batch(self, jobs, voice_name, min_rate=0.85, max_rate=1.15, pitch=0, concurrency=4,
+                      workers=2, max_requests=None, refresh_calibration=False, language_code=None,
+                      resume=True, job_progress=None, spread_lag=1, coalesce=False):
+        """Converts each ``(srt_file, output_file)`` in ``jobs`` into its own output.
+
+        Every job has its own timeline. Up to ``workers`` jobs run at once and,
+        across all of them, at most ``max_requests`` synthesis requests are in
+        flight. ``job_progress`` receives ``(job_index, percentage)``; the
+        overall percentage goes to ``progress``. Returns a ConversionResult per
+        job (None for jobs that failed) and logs a throughput report. Raises
+        ValueError if two jobs would write the same output file.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Jobs writing one output would share its partial file and manifest
+        outputs = Counter(os.path.normcase(os.path.abspath(output_file)) for _, output_file in jobs)
+        duplicates = sorted(output for output, count in outputs.items() if count > 1)
+        if duplicates:
+            raise ValueError("Several SRT files would be written to the same output: " + ", ".join(duplicates))
+
+        voice, language_code = self._resolve_voice(voice_name, language_code)
+        self.stopped = False
+        self.timings.reset()
+        self.scheduler.set_concurrency(max_requests or max(1, min(workers, len(jobs))) * concurrency)
+        with self._coalesced_lock:
+            self._coalesced_rejections = 0
+
+        # Calibrate once for the whole batch
+        cpm_model = self.determine_voice_characteristics(
+            [srt_file for srt_file, _ in jobs], voice, language_code, pitch, refresh=refresh_calibration
+        ).cpm_model
+
+        job_percentages = [0.0] * len(jobs)
+
+        def report_progress(index, value):
+            job_percentages[index] = value
+            if job_progress:
+                job_progress(index, value)
+            if self.progress:
+                self.progress(sum(job_percentages) / len(jobs))
+
+        def run_job(index):
+            srt_file, output_file = jobs[index]
+            try:
+                result = self._convert([srt_file], output_file, voice, language_code, cpm_model,
+                                       min_rate, max_rate, pitch, concurrency, resume,
+                                       lambda value: report_progress(index, value), spread_lag, coalesce)
+            except Exception as e:
+                self.log(f"Error converting {os.path.basename(srt_file)}: {e}\n")
+                return None
+            self.log(
+                f"Finished {os.path.basename(output_file)}: {result.cues} subtitles, "
+                f"{result.audio_seconds:.1f}s of audio in {result.wall_seconds:.1f}s\n"
+            )
+            return result
+
+        if max_requests:
+            self._request_slots = threading.BoundedSemaphore(max_requests)
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                results = list(executor.map(run_job, range(len(jobs))))
+        finally:
+            self._request_slots = None
+        wall_seconds = time.perf_counter() - start
+
+        finished = [result for result in results if result is not None]
+        cues = sum(result.cues for result in finished)
+        audio_seconds = sum(result.audio_seconds for result in finished)
+        self.log(
+            f"Batch: {sum(result.completed for result in finished)}/{len(jobs)} files, {cues} subtitles, "
+            f"{audio_seconds:.1f}s of audio in {wall_seconds:.1f}s "
+            f"({cues / wall_seconds:.2f} subtitles/s, {audio_seconds / wall_seconds:.2f} audio-seconds per second)\n"
+        )
+        self.log(f"Stage timings:\n{self.timings.format_summary()}\n")
+        return results
+
+    def _resolve_voice(self, voice_name, language_code=None):
+        voice = self.find_voice(voice_name)
+        if not voice:
+            raise ValueError(f"Invalid voice selected: {voice_name}")
+        return voice, language_code or voice.language_codes[0]
+
+    def _convert(self, srt_files, output_file, voice, language_code, cpm_model, min_rate, max_rate,
+                 pitch, concurrency, resume, progress, spread_lag=1, coalesce=False):
+        from audio_timeline import PcmAudio
+        from output_writer import StreamingTimeline
+        from synthesis_pipeline import CuePlanner
+
+        start = time.perf_counter()
+        job = {
+            "srt_files": [[os.path.abspath(f), os.path.getsize(f), os.path.getmtime(f)] for f in srt_files],
+            "backend": self.backend.cache_namespace,
+            "voice": voice.name,
+            "language_code": language_code,
+            "pitch": pitch,
+            "min_rate": min_rate,
+            "max_rate": max_rate,
+        }
+        final_audio = StreamingTimeline(output_file, job, resume=resume)
+        resume_point = final_audio.resume_point
+        if resume_point:
+            self.log(f"Resuming after subtitle {resume_point[1]+1} of {os.path.basename(srt_files[resume_point[0]])} "
+                     f"({final_audio.duration_seconds:.1f}s already converted)\n")
+        planner = CuePlanner(cpm_model, min_rate, max_rate, spread_lag)
+        # Keyed by (text, rate): a line synthesized again, e.g. speculatively and then for real, counts once
+        measured_samples = {}
+
+        def synthesize(text, rate):
+            # Work on uncompressed PCM throughout; the output is encoded once on export
+            result = self.synthesize(
+                text, voice, language_code, rate,
+                pitch,  # Apply pitch setting to conversion
+                "LINEAR16"
+            )
+            with self.timings.span("decode"):
+                audio = PcmAudio.from_wav(result.audio_content)
+            if not result.cached and len(text.strip()) >= 5:
+                # Every line the engine spoke, speculative or not, refines the voice model; audio
+                # from the cache was measured when it was first synthesized
+                measured_samples[text, quantize_rate(rate)] = (quantize_rate(rate),
+                                                               len(text) / (audio.duration_seconds / 60))
+            with self.timings.span("trim"):
+                return trim_silence(audio)
+
+        def synthesize_group(texts, rate):
+            # Clips cut from a coalesced request carry no engine padding, so they are not calibration samples
+            clips = self.synthesize_coalesced(texts, voice, language_code, rate, pitch)
+            with self.timings.span("trim"):
+                return [clip if isinstance(clip, Exception) else (trim_silence(clip[0]), clip[1]) for clip in clips]
+
+        if coalesce and not self.backend.supports_ssml:
+            self.log("The speech engine does not accept SSML; subtitles will not be coalesced\n")
+            coalesce = False
+
+        failed = []
+        try:
+            cues = self._convert_files(srt_files, final_audio, resume_point, planner, synthesize, concurrency,
+                                       voice, language_code, pitch, progress, failed,
+                                       synthesize_group if coalesce else None)
+        except BaseException:
+            # Keep what was committed so a rerun can resume from it
+            final_audio.close()
+            raise
+        finally:
+            self.voice_models.add_samples(voice.name, language_code, pitch, list(measured_samples.values()))
+
+        if failed:
+            self.log(f"{len(failed)} subtitle(s) could not be synthesized and were left silent:\n" + "".join(
+                f"  {os.path.basename(cue.srt_file)} #{cue.subtitle} at {cue.start:.2f}s: {cue.error}\n"
+                for cue in failed
+            ))
+        self.log(self.scheduler.stats() + "\n")
+
+        audio_seconds = final_audio.duration_seconds
+        if self.stopped:
+            final_audio.close()
+            self.log(f"Stopped {os.path.basename(output_file)} after {audio_seconds:.1f}s of audio; "
+                     f"start the same conversion again to resume\n")
+        else:
+            with self.timings.span("export"):
+                final_audio.finish(format=os.path.splitext(output_file)[1][1:] or "mp3")
+        return ConversionResult(not self.stopped, cues, audio_seconds, time.perf_counter() - start, failed)
+
+    def _convert_files(self, srt_files, final_audio, resume_point, planner, synthesize, concurrency,
+                       voice, language_code, pitch, progress, failed, synthesize_group=None):
+        """Runs the cues of ``srt_files`` through the pipeline; returns how many were processed.
+
+        Cues whose synthesis failed are appended to ``failed`` as FailedCue.
+        ``synthesize_group``, if given, turns on coalescing (see SynthesisPipeline).
+        """
+        from synthesis_pipeline import SynthesisPipeline, place_cue
+
+        processed = 0
+        for file_index, srt_file in enumerate(srt_files):
+            if self.stopped:
+                break
+
+            first_cue = 0
+            if resume_point:
+                if file_index < resume_point[0]:
+                    continue
+                if file_index == resume_point[0]:
+                    first_cue = resume_point[1] + 1
+
+            # Each file starts where the previous file's audio ended
+            file_offset = final_audio.file_start_offset(file_index)
+            with self.timings.span("parse", file=os.path.basename(srt_file)):
+                subtitles = [
+                    (file_offset + cue.start, file_offset + cue.end, cue.text)
+                    for cue in parse_srt(srt_file)
+                ]
+            total_subtitles = len(subtitles)
+
+            pipeline = SynthesisPipeline(synthesize, planner, concurrency=concurrency, timer=self.timings,
+                                         synthesize_group=synthesize_group)
+            for result in pipeline.run(subtitles[first_cue:], final_audio):
+                self._running.wait()
+                if self.stopped:
+                    break
+
+                i = first_cue + result.index
+                processed += 1
+                subtitle_start_time, subtitle_end_time, text = result.cue
+                original_subtitle_duration = subtitle_end_time - subtitle_start_time
+                final_audio_duration = len(final_audio) / 1000
+                amount_lagging_behind, final_subtitle_duration, cpm_needed, final_cpm, final_rate = result.plan
+
+                if result.error is not None:
+                    # Fill the cue's slot with silence so every later cue keeps its timing
+                    final_audio.pad_to(subtitle_end_time)
+                    final_audio.commit(file_index, i, error=result.error)
+                    failed.append(FailedCue(srt_file, i + 1, subtitle_start_time - file_offset,
+                                            subtitle_end_time - file_offset, str(result.error)))
+                    self.log(f"Error processing subtitle {i+1}: {result.error} (left silent)\n")
+                    if progress:
+                        progress((i + 1) / total_subtitles * 100)
+                    continue
+
+                with self.timings.span("place"):
+                    pre_processed_duration, post_processed_duration = place_cue(
+                        final_audio, result.audio, text, final_subtitle_duration
+                    )
+                with self.timings.span("commit"):
+                    final_audio.commit(file_index, i, self.synthesis_key(
+                        text, voice, language_code, result.rate, pitch,
+                        COALESCED_ENCODING if result.coalesced else "LINEAR16"
+                    ))
+
+                if self.advanced_debug:
+                    self.log(
+                        f"Subtitle {i+1}/{total_subtitles}:\n"
+                        f"Start Time: {subtitle_start_time:.2f}s\n"
+                        f"End Time: {subtitle_end_time:.2f}s\n"
+                        f"Original Duration: {original_subtitle_duration:.2f}s\n"
+                        f"Final Audio Duration: {final_audio_duration:.2f}s\n"
+                        f"Amount Lagging Behind: {amount_lagging_behind:.2f}s\n"
+                        f"Final Subtitle Duration: {final_subtitle_duration:.2f}s\n"
+                        f"CPM Needed: {cpm_needed:.2f}\n"
+                        f"Final CPM: {final_cpm:.2f} {'(max)' if final_cpm == planner.max_cpm else '(min)' if final_cpm == planner.min_cpm else ''}\n"
+                        f"Rate: {result.rate:.3f}{' (speculative)' if result.rate != final_rate else ''}\n"
+                        f"Pre-Processed Duration: {pre_processed_duration:.2f}s\n"
+                        f"Post-Processed Duration: {post_processed_duration:.2f}s\n\n"
+                    )
+
+                if progress:
+                    progress((i + 1) / total_subtitles * 100)
+
+            self.log(
+                f"{os.path.basename(srt_file)}: {pipeline.requests} synthesis requests, "
+                f"{pipeline.reused} speculative results used, {pipeline.resynthesized} re-synthesized"
+                + (f", {pipeline.coalesced} subtitles coalesced\n" if synthesize_group else "\n")
+            )
+            self.log(self.cache_stats() + "\n")
+        return processed
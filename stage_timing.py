@@ -0,0 +1,105 @@
+"""Wall-clock timing of conversion stages.
+
+StageTimer records one span per stage execution (a stage name, the thread it
+ran on, its start and duration) and summarizes them per stage as count,
+total, p50, p95 and max. Recording a span costs two clock reads and an append
+under a lock, so timing stays on for every conversion. Spans can be exported
+in the Chrome trace event format, which chrome://tracing and Perfetto open
+directly; the per-stage summary is included in the same JSON file.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Collects timed spans; safe to use from several threads at once.
+
+    Only the last ``max_spans`` spans are kept for export, while the
+    per-stage durations behind the summary are all kept.
+    """
+
+    def __init__(self, max_spans=200000):
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._origin = time.perf_counter_ns()
+            self._spans = deque(maxlen=self.max_spans)
+            self._durations = {}
+
+    @contextmanager
+    def span(self, stage, **args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(stage, start, time.perf_counter_ns(), **args)
+
+    def record(self, stage, start_ns, end_ns, **args):
+        """Adds a span measured with ``time.perf_counter_ns``."""
+        duration = end_ns - start_ns
+        with self._lock:
+            self._durations.setdefault(stage, []).append(duration)
+            self._spans.append((stage, threading.get_ident(), start_ns, duration, args or None))
+
+    def summary(self):
+        """``{stage: {"count", "total", "p50", "p95", "max"}}`` with times in seconds."""
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+        summary = {}
+        for stage, values in durations.items():
+            summary[stage] = {
+                "count": len(values),
+                "total": sum(values) / 1e9,
+                "p50": _percentile(values, 50) / 1e9,
+                "p95": _percentile(values, 95) / 1e9,
+                "max": values[-1] / 1e9,
+            }
+        return summary
+
+    def format_summary(self):
+        summary = self.summary()
+        if not summary:
+            return "No stage timings recorded"
+        lines = [f"{'Stage':<16}{'count':>8}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for stage, stats in sorted(summary.items(), key=lambda item: -item[1]["total"]):
+            lines.append(
+                f"{stage:<16}{stats['count']:>8}{stats['total']:>10.2f}{stats['p50'] * 1000:>10.1f}"
+                f"{stats['p95'] * 1000:>10.1f}{stats['max'] * 1000:>10.1f}"
+            )
+        return "\n".join(lines)
+
+    def trace_events(self):
+        with self._lock:
+            spans = list(self._spans)
+            origin = self._origin
+        pid = os.getpid()
+        events = []
+        for stage, thread, start, duration, args in spans:
+            event = {"name": stage, "ph": "X", "pid": pid, "tid": thread,
+                     "ts": (start - origin) / 1000, "dur": duration / 1000}
+            if args:
+                event["args"] = args
+            events.append(event)
+        return events
+
+    def export(self, path):
+        """Writes the spans as a Chrome trace, with the stage summary under ``stageSummary``."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "traceEvents": self.trace_events(),
+                "displayTimeUnit": "ms",
+                "stageSummary": self.summary(),
+            }, f)
+
+
+def _percentile(sorted_values, percent):
+    # Nearest-rank percentile of an already sorted list
+    rank = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return sorted_values[rank]
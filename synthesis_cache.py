@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "subtitle-to-speech", "synthesis")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+RATE_STEP = 0.01
+
+
+def quantize_rate(rate):
+    """Rounds a speaking rate to the step used in cache keys."""
+    return round(round(rate / RATE_STEP) * RATE_STEP, 4)
+
+
+def synthesis_key(text, voice_name, language_code, rate, pitch, encoding, namespace=None):
+    """Content address of a synthesis request; ``namespace`` identifies the engine."""
+    fields = [text, voice_name, language_code, quantize_rate(rate), float(pitch), str(encoding), namespace]
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class SynthesisCache:
+    """On-disk cache of synthesized audio, keyed by ``synthesis_key``.
+
+    Entries are written atomically (temporary file plus rename), so a crash or
+    several processes sharing the directory never leave a partial entry. Once
+    the total size passes ``max_bytes``, on a write or when the cache is opened
+    with a smaller limit than the directory was filled to, the least recently
+    used entries are deleted; recency is the file's mtime, which is bumped on
+    every hit so that it survives restarts.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        with self._lock:
+            self._load_index()
+            self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".bin")
+
+    def _load_index(self):
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith(".bin"):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self._total_bytes -= size
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.bytes_read += len(data)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                # Written by another process sharing the directory
+                self._entries[key] = len(data)
+                self._total_bytes += len(data)
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self.bytes_written += len(data)
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        return (
+            f"Synthesis cache: {self.hits} hits, {self.misses} misses, "
+            f"{self.bytes_read / 1024 ** 2:.1f} MB read, {self.bytes_written / 1024 ** 2:.1f} MB written, "
+            f"{len(self._entries)} entries ({self._total_bytes / 1024 ** 2:.1f} MB), {self.evictions} evicted"
+        )
@@ -0,0 +1,334 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from stage_timing import StageTimer
+
+SENTENCE_ENDINGS = ('.', '。', '！', '!', '?', '？')
+CLAUSE_ENDINGS = (',', '，', '、', ';', '；')
+EDGE_SILENCE = 0.07
+RATE_BRACKET = (0.5, 2.0)
+
+CuePlan = namedtuple("CuePlan", [
+    "amount_lagging_behind", "final_subtitle_duration", "cpm_needed", "final_cpm", "rate"
+])
+CueResult = namedtuple("CueResult", ["index", "cue", "plan", "rate", "audio", "error", "coalesced"])
+
+
+def rates_for_cpm(cpm_model, target_cpm):
+    """Speaking rates at which ``cpm_model`` gives ``target_cpm``, for an array of targets.
+
+    Fitted models are polynomials of degree two at most and are inverted in
+    closed form, taking the root inside ``RATE_BRACKET``. Any other callable
+    is inverted through a lookup table over the bracket, which assumes it
+    increases with the rate there. Raises ValueError for a flat model.
+    """
+    target_cpm = np.asarray(target_cpm, dtype=float)
+    if isinstance(cpm_model, np.poly1d) and cpm_model.order <= 2:
+        c, b, a = (list(cpm_model.coeffs[::-1]) + [0.0, 0.0])[:3]
+        if a == 0 and b == 0:
+            raise ValueError("The CPM model does not change with the speaking rate")
+        if a == 0:
+            return (target_cpm - c) / b
+        # Stable form of the quadratic formula: -b and the root never cancel, so a
+        # nearly linear model keeps full precision; its far root lands outside the bracket
+        root = np.sqrt(np.maximum(b * b - 4 * a * (c - target_cpm), 0.0))
+        q = -(b + np.copysign(root, b)) / 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            first = q / a
+            second = np.where(q != 0, (c - target_cpm) / q, first)
+        return np.where((first >= RATE_BRACKET[0]) & (first <= RATE_BRACKET[1]), first, second)
+
+    rates = np.linspace(RATE_BRACKET[0], RATE_BRACKET[1], 3001)
+    return np.interp(target_cpm, cpm_model(rates), rates)
+
+
+def find_rate_for_cpm(cpm_model, target_cpm):
+    return float(rates_for_cpm(cpm_model, target_cpm))
+
+
+def trailing_silence(text):
+    """Seconds of silence to leave after a line, based on its punctuation."""
+    silence = EDGE_SILENCE
+    if text.strip().endswith(SENTENCE_ENDINGS):
+        silence += 0.5
+    elif text.strip().endswith(CLAUSE_ENDINGS):
+        silence += 0.25
+    return silence
+
+
+def place_cue(timeline, audio, text, final_subtitle_duration):
+    """Places a synthesized line at the end of ``timeline``.
+
+    The speech is framed by short edge silences plus a pause for its
+    punctuation, and padded at the front to fill the subtitle's slot.
+    Returns the pre- and post-padding durations in seconds.
+    """
+    pre_processed_duration = EDGE_SILENCE + len(audio) / 1000 + trailing_silence(text)
+    lead_silence = max(final_subtitle_duration - pre_processed_duration, 0)
+    post_processed_duration = pre_processed_duration + lead_silence
+
+    cue_offset = timeline.duration_seconds
+    timeline.place(audio, cue_offset + lead_silence + EDGE_SILENCE)
+    timeline.pad_to(cue_offset + post_processed_duration)
+    return pre_processed_duration, post_processed_duration
+
+
+class CuePlanner:
+    """Chooses the speaking rate for a subtitle from where the timeline currently ends.
+
+    A cue that starts while the timeline is still behind has to make up the
+    lag. By default it tries to make up all of it, which often pins it at
+    ``max_rate``; with ``spread_lag=n`` each cue only takes on its share of
+    the lag over the next ``n`` cues, so the speed-up is shared out.
+    """
+
+    def __init__(self, cpm_model, min_rate, max_rate, spread_lag=1):
+        self.cpm_model = cpm_model
+        self.min_cpm = cpm_model(min_rate)
+        self.max_cpm = cpm_model(max_rate)
+        self.spread_lag = max(1, spread_lag)
+
+    def _absorbed_lag(self, amount_lagging_behind, remaining):
+        if amount_lagging_behind <= 0:
+            return amount_lagging_behind
+        return amount_lagging_behind / min(self.spread_lag, max(remaining, 1))
+
+    def plan(self, text, start_time, end_time, timeline_seconds, remaining=1):
+        """Plans one cue; ``remaining`` counts it and the cues after it in the file."""
+        original_subtitle_duration = end_time - start_time
+        amount_lagging_behind = timeline_seconds - start_time
+        absorbed = self._absorbed_lag(amount_lagging_behind, remaining)
+        final_subtitle_duration = max(original_subtitle_duration - absorbed, 1)
+
+        cpm_needed = len(text) / (final_subtitle_duration / 60)
+        final_cpm = min(max(cpm_needed, self.min_cpm), self.max_cpm)
+        rate = find_rate_for_cpm(self.cpm_model, final_cpm)
+        return CuePlan(amount_lagging_behind, final_subtitle_duration, cpm_needed, final_cpm, rate)
+
+    def plan_all(self, cues, timeline_seconds, remaining=None, speech_bias=0.0):
+        """Plans ``cues`` in one pass from predicted durations.
+
+        Returns a CuePlan whose fields are arrays with one entry per cue. Each
+        cue's lag is taken from the predicted end of the cues before it, so
+        the plan drifts from reality as actual durations come in; ``plan``
+        gives the corrected plan for a cue once the timeline has reached it.
+        ``speech_bias`` is added to every predicted speech duration.
+        """
+        count = len(cues)
+        if remaining is None:
+            remaining = count
+        lags = [0.0] * count
+        durations = [0.0] * count
+        needed = [0.0] * count
+        final = [0.0] * count
+
+        # The lag of each cue depends on the predicted end of the previous one,
+        # so this walk is sequential; it only does float arithmetic
+        timeline = timeline_seconds
+        for i, (start_time, end_time, text) in enumerate(cues):
+            lag = timeline - start_time
+            duration = max(end_time - start_time - self._absorbed_lag(lag, remaining - i), 1)
+            cpm_needed = len(text) / (duration / 60)
+            cpm = min(max(cpm_needed, self.min_cpm), self.max_cpm)
+            speech = len(text) / (cpm / 60) + speech_bias
+            timeline += max(EDGE_SILENCE + speech + trailing_silence(text), duration)
+            lags[i], durations[i], needed[i], final[i] = lag, duration, cpm_needed, cpm
+
+        final = np.array(final)
+        return CuePlan(np.array(lags), np.array(durations), np.array(needed), final,
+                       rates_for_cpm(self.cpm_model, final))
+
+    def predict_duration(self, text, plan, speech_bias=0.0):
+        """Predicted timeline length of a cue synthesized according to ``plan``."""
+        speech = len(text) / (plan.final_cpm / 60) + speech_bias
+        return max(EDGE_SILENCE + speech + trailing_silence(text), plan.final_subtitle_duration)
+
+
+class SynthesisPipeline:
+    """Synthesizes subtitles ahead of the timeline with a bounded number of requests in flight.
+
+    A cue's rate depends on how far the timeline lags behind, which is only
+    known once every earlier cue has been placed. The pipeline predicts the
+    timeline forward with the CPM model, starts synthesis for the next
+    ``lookahead`` cues at their predicted rates and hands results back in
+    timeline order. A speculative result is used when its rate is within
+    ``rate_tolerance`` of the rate the cue actually needs; otherwise the cue is
+    synthesized again. With ``concurrency=1`` this is the plain serial loop.
+
+    Predictions are corrected as real durations arrive: ``speech_bias`` is a
+    running average of how much longer synthesized speech was than the model
+    predicted, and is added to every later prediction.
+
+    With ``synthesize_group``, consecutive look-ahead cues whose predicted
+    rates round to the same hundredth are coalesced: up to ``group_size`` of
+    them, ``group_characters`` characters in all, go to
+    ``synthesize_group(texts, rate)`` as one request, which returns an
+    ``(audio, coalesced)`` pair (or an exception) per text; ``coalesced`` is
+    False for clips it had to synthesize on their own. Each cue of the group
+    is then checked and placed on its own like any other speculative result.
+    """
+
+    def __init__(self, synthesize, planner, concurrency=1, lookahead=None, rate_tolerance=0.02, timer=None,
+                 synthesize_group=None, group_size=8, group_characters=300):
+        self.synthesize = synthesize
+        self.synthesize_group = synthesize_group
+        self.group_size = group_size
+        self.group_characters = group_characters
+        self.planner = planner
+        self.timer = timer or StageTimer()
+        self.concurrency = max(1, concurrency)
+        if lookahead is None:
+            lookahead = 0 if self.concurrency == 1 else self.concurrency * 2
+            if synthesize_group is not None:
+                # Room for a full group to form ahead of the cue being placed
+                lookahead = max(lookahead, group_size * 2)
+        self.lookahead = lookahead
+        self.rate_tolerance = rate_tolerance
+        self.requests = 0
+        self.reused = 0
+        self.resynthesized = 0
+        self.coalesced = 0
+        self.speech_bias = 0.0
+        self._corrections = 0
+
+    def _submit(self, executor, pending, index, text, rate):
+        self.requests += 1
+        pending[index] = (rate, executor.submit(self.synthesize, text, rate))
+
+    def _submit_group(self, executor, pending, cues, indexes, rate):
+        if len(indexes) == 1:
+            self._submit(executor, pending, indexes[0], cues[indexes[0]][2], rate)
+            return
+        self.requests += 1
+        self.coalesced += len(indexes)
+        group = _CoalescedRequest(executor.submit(self.synthesize_group, [cues[i][2] for i in indexes], rate),
+                                  len(indexes))
+        for position, index in enumerate(indexes):
+            pending[index] = (rate, _CoalescedCue(group, position))
+
+    def _submit_groups(self, executor, pending, cues, first, rates):
+        run, run_rate, run_characters = [], None, 0
+        for index, rate in enumerate(rates, first):
+            rate = round(float(rate), 2)
+            text = cues[index][2]
+            if run and (index in pending or rate != run_rate or len(run) == self.group_size
+                        or run_characters + len(text) > self.group_characters):
+                self._submit_group(executor, pending, cues, run, run_rate)
+                run, run_characters = [], 0
+            if index in pending:
+                continue
+            run.append(index)
+            run_rate = rate
+            run_characters += len(text)
+        # A run reaching the end of the look-ahead may still grow; it is submitted
+        # once it is closed off, unless it is already full or ends the file
+        if run and (len(run) == self.group_size or run[-1] == len(cues) - 1):
+            self._submit_group(executor, pending, cues, run, run_rate)
+
+    def _prefetch(self, executor, pending, cues, index, plan, timeline_seconds):
+        start_time, end_time, text = cues[index]
+        predicted_end = timeline_seconds + self.planner.predict_duration(text, plan, self.speech_bias)
+        ahead_cues = cues[index + 1:index + 1 + self.lookahead]
+        if not ahead_cues:
+            return
+        ahead_rates = self.planner.plan_all(ahead_cues, predicted_end, len(cues) - index - 1,
+                                            self.speech_bias).rate
+        if self.synthesize_group is not None:
+            self._submit_groups(executor, pending, cues, index + 1, ahead_rates)
+            return
+        for ahead, rate in enumerate(ahead_rates, index + 1):
+            if ahead not in pending:
+                self._submit(executor, pending, ahead, cues[ahead][2], float(rate))
+
+    def _correct(self, text, rate, audio):
+        predicted = len(text) / (self.planner.cpm_model(rate) / 60)
+        # Running mean over the last few dozen cues: settles quickly, then ignores per-line noise
+        self._corrections = min(self._corrections + 1, 30)
+        self.speech_bias += (len(audio) / 1000 - predicted - self.speech_bias) / self._corrections
+
+    def run(self, cues, timeline):
+        """Yields a CueResult per cue, in order.
+
+        ``cues`` is a list of ``(start_seconds, end_seconds, text)``. The caller
+        must place each result on ``timeline`` before advancing the generator,
+        since the next cue's rate is planned from ``timeline.duration_seconds``.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        pending = {}
+        try:
+            for index, cue in enumerate(cues):
+                start_time, end_time, text = cue
+                timeline_seconds = timeline.duration_seconds
+                with self.timer.span("plan"):
+                    plan = self.planner.plan(text, start_time, end_time, timeline_seconds, len(cues) - index)
+
+                speculative = pending.pop(index, None)
+                if speculative and abs(speculative[0] - plan.rate) <= self.rate_tolerance:
+                    rate, future = speculative
+                    self.reused += 1
+                else:
+                    if speculative:
+                        speculative[1].cancel()
+                        self.resynthesized += 1
+                    rate = plan.rate
+                    self._submit(executor, pending, index, text, rate)
+                    future = pending.pop(index)[1]
+
+                with self.timer.span("plan_ahead"):
+                    self._prefetch(executor, pending, cues, index, plan, timeline_seconds)
+
+                # Time spent waiting here is synthesis that the look-ahead did not hide
+                coalesced = False
+                try:
+                    with self.timer.span("synthesis_wait"):
+                        if isinstance(future, _CoalescedCue):
+                            audio, coalesced = future.result()
+                        else:
+                            audio = future.result()
+                    error = None
+                except Exception as e:
+                    audio, error = None, e
+                else:
+                    self._correct(text, rate, audio)
+                yield CueResult(index, cue, plan, rate, audio, error, coalesced)
+        finally:
+            for _, future in pending.values():
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+class _CoalescedRequest:
+    def __init__(self, future, size):
+        self.future = future
+        self.outstanding = size
+
+
+class _CoalescedCue:
+    """Future-like view of one cue's clip in a coalesced request.
+
+    The request is shared, so it is only cancelled once no cue of the group
+    still waits for it.
+    """
+
+    def __init__(self, request, position):
+        self.request = request
+        self.position = position
+
+    def _release(self):
+        self.request.outstanding -= 1
+        if self.request.outstanding == 0:
+            self.request.future.cancel()
+
+    def result(self):
+        try:
+            clip = self.request.future.result()[self.position]
+        finally:
+            self._release()
+        if isinstance(clip, Exception):
+            raise clip
+        return clip
+
+    def cancel(self):
+        self._release()
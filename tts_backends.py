@@ -0,0 +1,345 @@
+"""Text-to-speech engines the converter can synthesize with.
+
+A backend lists its voices and turns one request into a SynthesisResult.
+GoogleTTSBackend talks to Google Cloud Text-to-Speech; SyntheticTTSBackend
+generates audio locally with a predictable duration, optional latency and
+injected failures, so conversions can be benchmarked and tested offline.
+
+Backends with ``supports_ssml`` can also speak several texts in one request:
+``build_marked_ssml`` puts a ``<mark>`` before each text and a pause after
+it, and ``synthesize_ssml`` returns the audio together with the time each
+mark was reached, when the engine reports it.
+"""
+import io
+import random
+import re
+import threading
+import time
+import wave
+from collections import deque, namedtuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+Voice = namedtuple("Voice", ["name", "language_codes", "ssml_gender"])
+# ``cached`` is set when the audio came from the synthesis cache rather than the engine
+SynthesisResult = namedtuple("SynthesisResult", ["audio_content", "duration", "cached"], defaults=[False])
+# ``timepoints`` maps mark names to seconds from the start of the audio, or is None
+MarkedSynthesisResult = namedtuple("MarkedSynthesisResult", ["audio_content", "duration", "timepoints"])
+
+
+def mark_name(index):
+    return f"cue{index}"
+
+
+def build_marked_ssml(texts, pause=0.3):
+    """SSML speaking ``texts`` in order, each after a mark named ``mark_name(i)`` and followed by ``pause`` seconds."""
+    return "<speak>" + "".join(
+        f'<mark name="{mark_name(i)}"/>{escape(text)}<break time="{int(round(pause * 1000))}ms"/>'
+        for i, text in enumerate(texts)
+    ) + "</speak>"
+
+
+def audio_duration(audio_content, audio_encoding):
+    """Duration in seconds of LINEAR16 (WAV) audio, or None for compressed encodings."""
+    if audio_encoding != "LINEAR16":
+        return None
+    with wave.open(io.BytesIO(audio_content), 'rb') as wf:
+        return wf.getnframes() / wf.getframerate()
+
+
+class TTSBackend:
+    """Interface of a speech engine.
+
+    ``cache_namespace`` separates entries of different engines in the
+    synthesis cache. Engines that accept SSML set ``supports_ssml`` and
+    implement ``synthesize_ssml``.
+    """
+
+    cache_namespace = None
+    supports_ssml = False
+
+    def list_voices(self):
+        raise NotImplementedError
+
+    def synthesize(self, text, voice, language_code, rate, pitch, audio_encoding):
+        raise NotImplementedError
+
+    def synthesize_ssml(self, ssml, voice, language_code, rate, pitch, audio_encoding):
+        """Speaks an SSML document; returns a MarkedSynthesisResult."""
+        raise NotImplementedError
+
+
+class GoogleTTSBackend(TTSBackend):
+    """Google Cloud Text-to-Speech.
+
+    SSML requests go through the v1beta1 API, the one that reports mark
+    timepoints; with ``timepoints=False`` they use v1 and report none.
+    """
+
+    cache_namespace = "google"
+    supports_ssml = True
+
+    def __init__(self, client=None, beta_client=None, timepoints=True):
+        self._client = client
+        self._beta_client = beta_client
+        self.timepoints = timepoints
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google.cloud import texttospeech
+            self._client = texttospeech.TextToSpeechClient()
+        return self._client
+
+    @property
+    def beta_client(self):
+        if self._beta_client is None:
+            from google.cloud import texttospeech_v1beta1
+            self._beta_client = texttospeech_v1beta1.TextToSpeechClient()
+        return self._beta_client
+
+    def list_voices(self):
+        response = self.client.list_voices()
+        return response.voices
+
+    def synthesize(self, text, voice, language_code, rate, pitch, audio_encoding):
+        from google.cloud import texttospeech
+
+        synthesis_input = texttospeech.SynthesisInput(text=text)
+        voice_params = texttospeech.VoiceSelectionParams(
+            language_code=language_code,
+            name=voice.name,
+            ssml_gender=voice.ssml_gender
+        )
+        audio_config = texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding[audio_encoding],
+            speaking_rate=rate,
+            pitch=pitch
+        )
+        response = self.client.synthesize_speech(
+            input=synthesis_input, voice=voice_params, audio_config=audio_config
+        )
+        return SynthesisResult(response.audio_content, audio_duration(response.audio_content, audio_encoding))
+
+    def synthesize_ssml(self, ssml, voice, language_code, rate, pitch, audio_encoding):
+        if self.timepoints:
+            from google.cloud import texttospeech_v1beta1 as texttospeech
+            client = self.beta_client
+        else:
+            from google.cloud import texttospeech
+            client = self.client
+
+        request = dict(
+            input=texttospeech.SynthesisInput(ssml=ssml),
+            voice=texttospeech.VoiceSelectionParams(
+                language_code=language_code,
+                name=voice.name,
+                ssml_gender=voice.ssml_gender
+            ),
+            audio_config=texttospeech.AudioConfig(
+                audio_encoding=texttospeech.AudioEncoding[audio_encoding],
+                speaking_rate=rate,
+                pitch=pitch
+            )
+        )
+        if self.timepoints:
+            request["enable_time_pointing"] = [texttospeech.SynthesizeSpeechRequest.TimepointType.SSML_MARK]
+        response = client.synthesize_speech(request=request)
+        # Voices that do not support time pointing return no timepoints rather than an error
+        timepoints = {point.mark_name: point.time_seconds for point in getattr(response, "timepoints", ())}
+        return MarkedSynthesisResult(response.audio_content, audio_duration(response.audio_content, audio_encoding),
+                                     timepoints or None)
+
+
+class SyntheticTTSError(RuntimeError):
+    pass
+
+
+class SyntheticThrottleError(SyntheticTTSError):
+    """Refusal for exceeding the quota, with the HTTP status a real engine would report."""
+
+    code = 429
+
+
+# Rates at which SyntheticTTSBackend samples its speaking speed for ``cache_namespace``
+NAMESPACE_RATES = (0.25, 0.5, 0.75, 0.85, 1.0, 1.15, 1.5, 2.0, 4.0)
+
+
+class SyntheticTTSBackend(TTSBackend):
+    """Deterministic offline stand-in for a speech engine.
+
+    Speech lasts ``len(text) / (cpm_model(rate) / 60)`` seconds and is a tone
+    framed by ``lead_silence`` and ``tail_silence``, like real engines that pad
+    their output. Every request sleeps ``latency`` seconds (plus up to
+    ``latency_jitter``), fails with probability ``failure_rate`` and fails on
+    every ``fail_every``-th call. Randomness is seeded, so runs repeat exactly
+    as long as requests arrive in the same order.
+
+    Quota pressure is simulated with SyntheticThrottleError: requests beyond
+    ``quota_per_minute`` in any sliding minute are refused, as is every
+    request inside one of the ``throttle_windows``, ``(start, end)`` pairs in
+    seconds since the first request.
+
+    SSML requests understand ``<mark>`` and ``<break>``: each stretch of text
+    is a tone as above, breaks are silence, and the whole document is framed
+    by one lead and one tail silence. Mark timepoints are reported unless
+    ``report_timepoints`` is False, which stands in for engines that cannot.
+    """
+
+    supports_ssml = True
+
+    def __init__(self, cpm_model=None, frame_rate=24000, latency=0.0, latency_jitter=0.0,
+                 failure_rate=0.0, fail_every=None, lead_silence=0.1, tail_silence=0.15,
+                 voices=None, seed=0, quota_per_minute=None, throttle_windows=(), report_timepoints=True):
+        self.cpm_model = cpm_model or (lambda rate: 900.0 * rate)
+        self.frame_rate = frame_rate
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self.fail_every = fail_every
+        self.lead_silence = lead_silence
+        self.tail_silence = tail_silence
+        self.voices = voices or [
+            Voice("Synthetic-A", ["en-US"], "NEUTRAL"),
+            Voice("Synthetic-B", ["ja-JP"], "NEUTRAL"),
+        ]
+        self.quota_per_minute = quota_per_minute
+        self.throttle_windows = list(throttle_windows)
+        self.report_timepoints = report_timepoints
+        self.calls = 0
+        self.throttled = 0
+        self._accepted = deque()
+        self._started = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def cache_namespace(self):
+        # Sampled across the rate range, so models that agree at 1.0 but not elsewhere get separate entries
+        speeds = ",".join(f"{self.cpm_model(rate):g}" for rate in NAMESPACE_RATES)
+        return f"synthetic:{speeds}:{self.frame_rate}:{self.lead_silence:g}:{self.tail_silence:g}"
+
+    def list_voices(self):
+        return self.voices
+
+    def speech_duration(self, text, rate):
+        return len(text) / (self.cpm_model(rate) / 60)
+
+    def _tone(self, text, rate, pitch):
+        import numpy as np
+
+        speech_frames = int(self.speech_duration(text, rate) * self.frame_rate)
+        t = np.arange(speech_frames) / self.frame_rate
+        frequency = 220.0 * 2 ** (pitch / 12)
+        return (np.sin(2 * np.pi * frequency * t) * 8000).astype(np.int16)
+
+    def _silence(self, seconds):
+        import numpy as np
+
+        return np.zeros(int(seconds * self.frame_rate), dtype=np.int16)
+
+    def _render(self, text, rate, pitch):
+        import numpy as np
+
+        return np.concatenate([self._silence(self.lead_silence), self._tone(text, rate, pitch),
+                               self._silence(self.tail_silence)])
+
+    def _render_ssml(self, ssml, rate, pitch):
+        """Returns the samples of an SSML document and the frame at which each mark was reached."""
+        import numpy as np
+
+        root = ElementTree.fromstring(ssml)
+        pieces = [self._silence(self.lead_silence)]
+        frames = len(pieces[0])
+        marks = {}
+
+        def speak(text):
+            nonlocal frames
+            text = " ".join((text or "").split())
+            if text:
+                pieces.append(self._tone(text, rate, pitch))
+                frames += len(pieces[-1])
+
+        speak(root.text)
+        for element in root:
+            if element.tag == "mark":
+                marks[element.get("name")] = frames
+            elif element.tag == "break":
+                pieces.append(self._silence(_break_seconds(element.get("time", "0ms"))))
+                frames += len(pieces[-1])
+            else:
+                # Other markup is read out as its text; marks nested inside it are not reported
+                speak("".join(element.itertext()))
+            speak(element.tail)
+        pieces.append(self._silence(self.tail_silence))
+        return np.concatenate(pieces), marks
+
+    def _throttle(self, now):
+        if self._started is None:
+            self._started = now
+        elapsed = now - self._started
+        if any(start <= elapsed < end for start, end in self.throttle_windows):
+            return True
+        if self.quota_per_minute is not None:
+            while self._accepted and self._accepted[0] <= now - 60:
+                self._accepted.popleft()
+            if len(self._accepted) >= self.quota_per_minute:
+                return True
+            self._accepted.append(now)
+        return False
+
+    def _next_request(self):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            delay = self.latency + self._random.random() * self.latency_jitter
+            fail = self._random.random() < self.failure_rate or bool(self.fail_every and call % self.fail_every == 0)
+            error = SyntheticTTSError(f"Injected failure on request {call}") if fail else None
+            if self._throttle(time.monotonic()):
+                self.throttled += 1
+                error = SyntheticThrottleError(f"Quota exceeded on request {call}")
+        return delay, error
+
+    def _encode(self, samples, audio_encoding):
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.frame_rate)
+            wf.writeframes(samples.tobytes())
+        audio_content = buffer.getvalue()
+
+        if audio_encoding != "LINEAR16":
+            from pydub import AudioSegment
+            out = io.BytesIO()
+            AudioSegment.from_wav(io.BytesIO(audio_content)).export(out, format=audio_encoding.lower())
+            audio_content = out.getvalue()
+        return audio_content
+
+    def _synthesize(self, error, text, rate, pitch, audio_encoding):
+        if error is not None:
+            raise error
+        samples = self._render(text, rate, pitch)
+        return SynthesisResult(self._encode(samples, audio_encoding), len(samples) / self.frame_rate)
+
+    def synthesize(self, text, voice, language_code, rate, pitch, audio_encoding):
+        delay, error = self._next_request()
+        time.sleep(delay)
+        return self._synthesize(error, text, rate, pitch, audio_encoding)
+
+    def synthesize_ssml(self, ssml, voice, language_code, rate, pitch, audio_encoding):
+        delay, error = self._next_request()
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        samples, marks = self._render_ssml(ssml, rate, pitch)
+        timepoints = {name: frame / self.frame_rate for name, frame in marks.items()}
+        return MarkedSynthesisResult(self._encode(samples, audio_encoding), len(samples) / self.frame_rate,
+                                     timepoints if self.report_timepoints else None)
+
+
+def _break_seconds(value):
+    match = re.fullmatch(r"\s*([\d.]+)\s*(ms|s)\s*", value)
+    if not match:
+        return 0.0
+    return float(match.group(1)) / (1000 if match.group(2) == "ms" else 1)
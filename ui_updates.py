@@ -0,0 +1,60 @@
+"""Hand-off of progress and log output from worker threads to a UI thread.
+
+Tk widgets may only be touched from the thread running the main loop, and
+redrawing them for every subtitle slows a conversion down. Workers publish
+updates into an UpdateChannel, which only queues them; the UI thread calls
+``drain`` on a timer and applies everything that arrived since the last tick
+in one go: log text joined into a single insert, only the latest progress
+value, and queued calls in order.
+"""
+import queue
+from collections import deque, namedtuple
+
+DEFAULT_MAX_LOG_LINES = 5000
+
+Updates = namedtuple("Updates", ["log", "progress", "calls"])
+
+
+class UpdateChannel:
+    """Thread-safe queue of UI updates, coalesced when drained.
+
+    Log output is kept as a ring buffer of the last ``max_log_lines`` lines,
+    so a flood of messages between two ticks costs the UI no more than one
+    screenful of text.
+    """
+
+    def __init__(self, max_log_lines=DEFAULT_MAX_LOG_LINES):
+        self.max_log_lines = max_log_lines
+        self._queue = queue.SimpleQueue()
+
+    def log(self, message):
+        self._queue.put(("log", message))
+
+    def progress(self, value):
+        self._queue.put(("progress", value))
+
+    def call(self, function, *args):
+        """Runs ``function(*args)`` on the UI thread at the next drain."""
+        self._queue.put(("call", function, args))
+
+    def drain(self):
+        """Returns the Updates that arrived since the last drain, or None if there were none."""
+        lines = deque(maxlen=self.max_log_lines)
+        progress = None
+        calls = []
+        received = False
+        while True:
+            try:
+                update = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            received = True
+            if update[0] == "log":
+                lines.extend(update[1].splitlines(keepends=True))
+            elif update[0] == "progress":
+                progress = update[1]
+            else:
+                calls.append(update[1:])
+        if not received:
+            return None
+        return Updates("".join(lines), progress, calls)
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "subtitle-to-speech", "voice_models.json")
+DEFAULT_MAX_AGE_DAYS = 30
+MAX_MEASURED_SAMPLES = 2000
+
+
+def voice_model_key(voice_name, language_code, pitch):
+    return f"{voice_name}|{language_code}|{float(pitch):g}"
+
+
+def fit_cpm_model(samples):
+    """Fits CPM as a quadratic in speaking rate from ``(rate, cpm)`` samples."""
+    # Calculate average CPM for each rate
+    avg_cpm_data = {}
+    for rate, cpm in samples:
+        avg_cpm_data.setdefault(round(rate, 2), []).append(cpm)
+    rates = sorted(avg_cpm_data)
+    cpms = [sum(avg_cpm_data[rate]) / len(avg_cpm_data[rate]) for rate in rates]
+
+    # Fit polynomial regression model
+    coeffs = np.polyfit(rates, cpms, 2)
+    return np.poly1d(coeffs), rates, cpms
+
+
+class VoiceModel:
+    """Characters-per-minute model of one voice, with the samples it was fitted from.
+
+    ``calibration_samples`` come from the dedicated calibration run across the
+    whole rate range; ``measured_samples`` are real cue durations added during
+    conversions and refine the fit around the rates actually used.
+    """
+
+    def __init__(self, calibration_samples, measured_samples=(), calibrated_at=None):
+        self.calibration_samples = [tuple(s) for s in calibration_samples]
+        self.measured_samples = [tuple(s) for s in measured_samples]
+        self.calibrated_at = time.time() if calibrated_at is None else calibrated_at
+        self.refit()
+
+    def refit(self):
+        self.cpm_model, self.rates, self.cpms = fit_cpm_model(self.calibration_samples + self.measured_samples)
+
+    def add_samples(self, samples):
+        self.measured_samples.extend(tuple(s) for s in samples)
+        del self.measured_samples[:-MAX_MEASURED_SAMPLES]
+        self.refit()
+
+    def age_days(self):
+        return (time.time() - self.calibrated_at) / 86400
+
+    def to_dict(self):
+        return {
+            "coefficients": list(self.cpm_model.coeffs),
+            "calibration_samples": self.calibration_samples,
+            "measured_samples": self.measured_samples,
+            "calibrated_at": self.calibrated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["calibration_samples"], data.get("measured_samples", ()), data["calibrated_at"])
+
+
+class VoiceModelStore:
+    """Persists fitted voice models in a JSON file so calibration runs once per voice."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.path = path
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._models = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._models = {key: VoiceModel.from_dict(data) for key, data in json.load(f).items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def get(self, voice_name, language_code, pitch):
+        """Returns the stored model, or None if there is none or it has expired."""
+        with self._lock:
+            model = self._models.get(voice_model_key(voice_name, language_code, pitch))
+        if model is None or (self.max_age_days is not None and model.age_days() > self.max_age_days):
+            return None
+        return model
+
+    def put(self, voice_name, language_code, pitch, model):
+        with self._lock:
+            self._models[voice_model_key(voice_name, language_code, pitch)] = model
+            self._save()
+
+    def add_samples(self, voice_name, language_code, pitch, samples):
+        """Adds measured ``(rate, cpm)`` samples to a stored model and refits it."""
+        with self._lock:
+            model = self._models.get(voice_model_key(voice_name, language_code, pitch))
+            if model is None or not samples:
+                return
+            model.add_samples(samples)
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({key: model.to_dict() for key, model in self._models.items()}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise